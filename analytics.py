@@ -0,0 +1,230 @@
+"""
+Precomputed sales rollups for the admin summary page.
+
+Three tables are kept in step with the orders:
+- order_daily_rollups: orders and revenue per day and status
+- book_sales_rollups: order lines, copies sold and revenue per book
+- customer_spend_rollups: orders and spend per customer
+
+Checkout and order status changes update them incrementally, in the same
+transaction as the order write. rebuild_rollups() recomputes them from the
+order tables; run ``python analytics.py`` after bulk imports, or
+periodically to correct any drift.
+
+Time series over orders bucket by day, week or month. date_bucket() builds
+the matching SQL expression for MySQL and SQLite; revenue_series() uses the
+indexed order_day/order_month columns so a date range is an index range
+scan rather than a function applied to every order_date.
+"""
+
+import os
+import sys
+from decimal import Decimal
+
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from model import db, Order, OrderItem, OrderDailyRollup, BookSalesRollup, CustomerSpendRollup
+
+# Order statuses that count towards recognised (monthly) revenue
+REVENUE_STATUSES = ('completed', 'delivered')
+
+BUCKET_GRANULARITIES = ('day', 'week', 'month')
+
+
+def month_of(day):
+    return day.strftime('%Y-%m')
+
+
+def date_bucket(column, granularity):
+    """SQL expression bucketing a date/datetime column for the current dialect.
+
+    day -> DATE, week -> DATE of that week's Monday, month -> 'YYYY-MM'.
+    """
+    if granularity not in BUCKET_GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+
+    dialect = db.engine.dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        if granularity == 'day':
+            return db.func.date(column, type_=db.Date)
+        if granularity == 'week':
+            return db.func.subdate(db.func.date(column), db.func.weekday(column), type_=db.Date)
+        return db.func.date_format(column, '%Y-%m')
+    if dialect == 'sqlite':
+        if granularity == 'day':
+            return db.func.date(column, type_=db.Date)
+        if granularity == 'week':
+            return db.func.date(column, 'weekday 0', '-6 days', type_=db.Date)
+        return db.func.strftime('%Y-%m', column)
+    raise ValueError(f"Date bucketing is not supported for {dialect}")
+
+
+def order_bucket(granularity):
+    """Bucket expression for orders, reading the persisted bucket columns"""
+    if granularity == 'day':
+        return Order.order_day
+    if granularity == 'month':
+        return Order.order_month
+    return date_bucket(Order.order_day, granularity)
+
+
+def revenue_series(granularity, start=None, end=None, statuses=REVENUE_STATUSES):
+    """(bucket, revenue, order_count) rows for orders placed from start to end (dates, inclusive)"""
+    bucket = order_bucket(granularity).label('bucket')
+    query = db.session.query(
+        bucket,
+        db.func.coalesce(db.func.sum(Order.total_amount), 0).label('revenue'),
+        db.func.count(Order.order_id).label('order_count')
+    )
+    # Range predicates on the indexed day column, never on a function of order_date
+    if start is not None:
+        query = query.filter(Order.order_day >= start)
+    if end is not None:
+        query = query.filter(Order.order_day <= end)
+    if statuses:
+        query = query.filter(Order.status.in_(statuses))
+    return query.group_by(bucket).order_by(bucket).all()
+
+
+def backfill_order_buckets():
+    """Fill order_day/order_month for orders written outside the ORM. Caller commits."""
+    result = db.session.execute(
+        db.update(Order)
+        .where(Order.order_date.isnot(None), Order.order_day.is_(None))
+        .values(order_day=date_bucket(Order.order_date, 'day'),
+                order_month=date_bucket(Order.order_date, 'month'),
+                # Derived columns only: keep updated_at's onupdate from marking the orders changed
+                updated_at=Order.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def upsert_increments(model, rows, key_columns, counter_columns):
+    """Insert rows, adding their counters onto any existing row with the same key"""
+    if not rows:
+        return
+    if db.engine.dialect.name in ('mysql', 'mariadb'):
+        stmt = mysql_insert(model).values(rows)
+        stmt = stmt.on_duplicate_key_update({
+            column: getattr(model, column) + getattr(stmt.inserted, column) for column in counter_columns
+        })
+    else:
+        stmt = sqlite_insert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={column: getattr(model, column) + getattr(stmt.excluded, column) for column in counter_columns}
+        )
+    db.session.execute(stmt)
+
+
+def daily_row(order, status, sign=1):
+    day = order.order_date.date()
+    return {
+        'day': day,
+        'status': status,
+        'month': month_of(day),
+        'order_count': sign,
+        'revenue': sign * Decimal(order.total_amount or 0)
+    }
+
+
+def record_order(order):
+    """Add a new order (with its items) to the rollups. Caller commits."""
+    if order.order_date is None or order.status is None:
+        return
+    upsert_increments(OrderDailyRollup, [daily_row(order, order.status)],
+                      ['day', 'status'], ['order_count', 'revenue'])
+
+    books = {}
+    for item in order.order_items:
+        row = books.setdefault(item.book_id, {'book_id': item.book_id, 'times_ordered': 0,
+                                              'total_sold': 0, 'revenue': Decimal('0.00')})
+        row['times_ordered'] += 1
+        row['total_sold'] += item.quantity
+        row['revenue'] += Decimal(item.price_at_time or 0) * item.quantity
+    upsert_increments(BookSalesRollup, list(books.values()),
+                      ['book_id'], ['times_ordered', 'total_sold', 'revenue'])
+
+    if order.user_id is not None:
+        upsert_increments(CustomerSpendRollup,
+                          [{'user_id': order.user_id, 'total_orders': 1,
+                            'total_spent': Decimal(order.total_amount or 0)}],
+                          ['user_id'], ['total_orders', 'total_spent'])
+
+
+def record_status_change(order, old_status):
+    """Move an order between status buckets of its day. Caller commits."""
+    if order.order_date is None or old_status == order.status:
+        return
+    rows = [daily_row(order, status, sign) for status, sign in ((old_status, -1), (order.status, 1)) if status]
+    upsert_increments(OrderDailyRollup, rows, ['day', 'status'], ['order_count', 'revenue'])
+
+
+def rebuild_rollups():
+    """Recompute every rollup from the order tables and commit"""
+    backfill_order_buckets()
+    for model in (OrderDailyRollup, BookSalesRollup, CustomerSpendRollup):
+        db.session.query(model).delete(synchronize_session=False)
+
+    daily = db.session.query(
+        Order.order_day,
+        Order.status,
+        db.func.count(Order.order_id),
+        db.func.coalesce(db.func.sum(Order.total_amount), 0)
+    ).filter(Order.order_day.isnot(None), Order.status.isnot(None))\
+     .group_by(Order.order_day, Order.status).all()
+    daily_rows = [
+        {'day': order_day, 'status': status, 'month': month_of(order_day),
+         'order_count': count, 'revenue': revenue}
+        for order_day, status, count, revenue in daily
+    ]
+    if daily_rows:
+        db.session.execute(db.insert(OrderDailyRollup), daily_rows)
+
+    db.session.execute(db.insert(BookSalesRollup).from_select(
+        ['book_id', 'times_ordered', 'total_sold', 'revenue'],
+        db.select(
+            OrderItem.book_id,
+            db.func.count(OrderItem.order_item_id),
+            db.func.sum(OrderItem.quantity),
+            db.func.coalesce(db.func.sum(OrderItem.price_at_time * OrderItem.quantity), 0)
+        ).where(OrderItem.book_id.isnot(None)).group_by(OrderItem.book_id)
+    ))
+
+    db.session.execute(db.insert(CustomerSpendRollup).from_select(
+        ['user_id', 'total_orders', 'total_spent'],
+        db.select(
+            Order.user_id,
+            db.func.count(Order.order_id),
+            db.func.coalesce(db.func.sum(Order.total_amount), 0)
+        ).where(Order.user_id.isnot(None)).group_by(Order.user_id)
+    ))
+
+    db.session.commit()
+    return len(daily_rows)
+
+
+def main():
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from app import app
+
+    print("🔄 Rebuilding sales rollups...")
+    print("=" * 50)
+
+    with app.app_context():
+        try:
+            db.create_all()
+            days = rebuild_rollups()
+            print(f"✅ Rebuilt rollups ({days:,} day/status buckets, "
+                  f"{BookSalesRollup.query.count():,} books, {CustomerSpendRollup.query.count():,} customers)")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error rebuilding rollups: {e}")
+            import traceback
+            traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
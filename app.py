@@ -4,15 +4,31 @@ from flask_jwt_extended import create_access_token, jwt_required, JWTManager, ge
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 import os
+import re
+import json
+import base64
+import uuid
 from datetime import datetime, timezone, timedelta
+from decimal import Decimal
 from functools import wraps
 from dotenv import load_dotenv
+from sqlalchemy.dialects.mysql import match, insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import joinedload, selectinload
 
 # Load environment variables
 load_dotenv()
 
 # Import models
-from model import db, User, Book, BookImage, Review, CartItem, Order, OrderItem, app as model_app
+from model import (db, User, Book, BookImage, Review, CartItem, Order, OrderItem,
+                   OrderDailyRollup, BookSalesRollup, CustomerSpendRollup, StockReservation,
+                   app as model_app)
+from catalog_cache import create_catalog_cache, CatalogCache, LRUCacheBackend
+from cart_store import create_cart_store
+from analytics import REVENUE_STATUSES, BUCKET_GRANULARITIES, record_status_change, revenue_series
+from checkout import place_order, DELIVERY_CHARGE, FREE_DELIVERY_THRESHOLD
+from reservations import (user_holder, session_holder, get_available_stock, reserve_stock, refresh_holds,
+                          hold_quantities, release_holds, transfer_holds, start_reservation_sweeper)
 
 app = Flask(__name__)
 
@@ -27,11 +43,37 @@ app.config["JWT_SECRET_KEY"] = os.environ.get('JWT_SECRET_KEY', "your-super-secr
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=1)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-for-sessions')
 
+# Catalog cache configuration (lru, shared-local, redis or none)
+app.config['CATALOG_CACHE_BACKEND'] = os.environ.get('CATALOG_CACHE_BACKEND', 'lru')
+app.config['CATALOG_CACHE_TTL'] = int(os.environ.get('CATALOG_CACHE_TTL', 300))
+app.config['CATALOG_CACHE_MAX_ENTRIES'] = int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', 1024))
+app.config['CATALOG_CACHE_REDIS_URL'] = os.environ.get('CATALOG_CACHE_REDIS_URL')
+
+# Anonymous cart storage (cookie or sqlite, see cart_store.py)
+app.config['ANONYMOUS_CART_STORE'] = os.environ.get('ANONYMOUS_CART_STORE', 'cookie')
+app.config['ANONYMOUS_CART_SQLITE_PATH'] = os.environ.get(
+    'ANONYMOUS_CART_SQLITE_PATH', os.path.join(app.instance_path, 'anonymous_carts.db'))
+app.config['ANONYMOUS_CART_TTL_DAYS'] = int(os.environ.get('ANONYMOUS_CART_TTL_DAYS', 30))
+
+# Per-filter order count/revenue cache for /admin/orders, in seconds (0 disables it).
+# Process-local: other app processes see order changes once their entries expire.
+app.config['ORDER_STATS_CACHE_TTL'] = int(os.environ.get('ORDER_STATS_CACHE_TTL', 0))
+
+# Cart stock holds (see reservations.py)
+app.config['RESERVATION_HOLD_MINUTES'] = int(os.environ.get('RESERVATION_HOLD_MINUTES', 15))
+app.config['RESERVATION_SWEEP_INTERVAL_SECONDS'] = int(os.environ.get('RESERVATION_SWEEP_INTERVAL_SECONDS', 60))
+# Units an anonymous cart may hold in total; further units are stock-checked but not held
+app.config['RESERVATION_ANONYMOUS_MAX_UNITS'] = int(os.environ.get('RESERVATION_ANONYMOUS_MAX_UNITS', 5))
+
 # Initialize extensions
 db.init_app(app)
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
 CORS(app)
+catalog_cache = create_catalog_cache(app.config)
+anonymous_cart = create_cart_store(app.config)
+order_stats_cache = CatalogCache(LRUCacheBackend(max_entries=256), app.config['ORDER_STATS_CACHE_TTL'],
+                                 enabled=app.config['ORDER_STATS_CACHE_TTL'] > 0)
 
 # ============================================================================
 # UTILITY FUNCTIONS
@@ -63,39 +105,658 @@ def get_current_user():
         return User.query.get(session['user_id'])
     return None
 
+def get_reservation_holder():
+    """Stock hold owner for the current visitor: the user, or an anonymous session key"""
+    if 'user_id' in session:
+        return user_holder(session['user_id'])
+    if 'reservation_key' not in session:
+        session['reservation_key'] = uuid.uuid4().hex
+    return session_holder(session['reservation_key'])
+
 def get_cart_items(user_id=None):
     """Get cart items for user (from session or database)"""
     if user_id:
-        # Database cart for logged-in users
-        cart_items = CartItem.query.filter_by(user_id=user_id).all()
-        cart_data = []
-        for item in cart_items:
-            book = Book.query.get(item.book_id)
-            if book:
-                cart_data.append({
-                    'cart_item_id': item.cart_item_id,
-                    'id': book.book_id,
-                    'title': book.title,
-                    'author': book.author,
-                    'description': book.description,
-                    'price': float(book.price) if book.price else 0.0,
-                    'quantity': item.quantity,
-                    'image_url': get_main_image_url(book.book_id)
-                })
-        return cart_data
+        # Database cart: cart rows, book columns and main image in one query
+        rows = db.session.query(
+            CartItem.cart_item_id,
+            CartItem.quantity,
+            Book.book_id,
+            Book.title,
+            Book.author,
+            Book.description,
+            Book.price,
+            main_image_url_column()
+        ).join(Book, Book.book_id == CartItem.book_id)\
+         .filter(CartItem.user_id == user_id)\
+         .order_by(CartItem.cart_item_id).all()
+        return [
+            serialize_cart_line(book_id, title, author, description, price, quantity, image_url, cart_item_id)
+            for cart_item_id, quantity, book_id, title, author, description, price, image_url in rows
+        ]
     else:
-        # Session cart for anonymous users
-        return session.get('cart', [])
+        # Anonymous cart: stored (book_id, quantity) pairs, hydrated here
+        return hydrate_cart_lines(anonymous_cart.load(session))
+
+def hydrate_cart_lines(items):
+    """Cart lines for {book_id: quantity} in one batched query, skipping removed books"""
+    if not items:
+        return []
+    rows = db.session.query(
+        Book.book_id,
+        Book.title,
+        Book.author,
+        Book.description,
+        Book.price,
+        main_image_url_column()
+    ).filter(Book.book_id.in_(list(items))).all()
+    books = {row.book_id: row for row in rows}
+    
+    cart_data = []
+    for book_id, quantity in items.items():
+        book = books.get(book_id)
+        if book:
+            cart_data.append(serialize_cart_line(book.book_id, book.title, book.author, book.description,
+                                                 book.price, quantity, book.main_image_url))
+    return cart_data
+
+def merge_cart_items(user_id, items):
+    """Add {book_id: quantity} to a user's database cart in one upsert.
+
+    New rows and increased quantities are clamped to each book's current
+    stock in the same statement; books that are gone or out of stock are
+    skipped. Relies on the unique (user_id, book_id) constraint on
+    cart_items. Caller commits.
+    """
+    if not items:
+        return
+    requested = db.case(items, value=Book.book_id)
+    least = db.func.least if is_mysql() else db.func.min
+    rows = db.select(db.literal(user_id), Book.book_id, least(requested, Book.stock))\
+        .where(Book.book_id.in_(list(items)), Book.stock > 0)
+    columns = ['user_id', 'book_id', 'quantity']
+    
+    if is_mysql():
+        # INSERT ... SELECT may refer to the selected books row in ON DUPLICATE KEY UPDATE
+        stmt = mysql_insert(CartItem).from_select(columns, rows)
+        stmt = stmt.on_duplicate_key_update(
+            quantity=least(CartItem.quantity + stmt.inserted.quantity, Book.stock)
+        )
+    else:
+        # SQLite (development): ON CONFLICT cannot see the selected row, look the stock up again
+        stmt = sqlite_insert(CartItem).from_select(columns, rows)
+        stock = db.select(Book.stock).where(Book.book_id == db.literal_column('excluded.book_id'))\
+            .scalar_subquery()
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'book_id'],
+            set_={'quantity': least(CartItem.quantity + stmt.excluded.quantity, stock)}
+        )
+    db.session.execute(stmt)
+
+def reorder_to_cart(user_id, order_id):
+    """Add every item of one of the user's past orders back into their cart.
+
+    Current book prices and stock are read in one query, as much of each
+    item as is available is held, and the cart is updated with one upsert.
+    Returns a per-item report, or None when the order is not the user's.
+    """
+    order = Order.query.filter_by(order_id=order_id, user_id=user_id).first()
+    if not order:
+        return None
+    
+    rows = db.session.query(
+        OrderItem.book_id,
+        OrderItem.quantity,
+        OrderItem.price_at_time,
+        Book.title,
+        Book.price,
+        db.func.coalesce(CartItem.quantity, 0)
+    ).outerjoin(Book, Book.book_id == OrderItem.book_id)\
+     .outerjoin(CartItem, db.and_(CartItem.book_id == OrderItem.book_id, CartItem.user_id == user_id))\
+     .filter(OrderItem.order_id == order_id)\
+     .order_by(OrderItem.order_item_id).all()
+    
+    requested, in_cart, details = {}, {}, {}
+    for book_id, quantity, price_at_time, title, price, cart_quantity in rows:
+        requested[book_id] = requested.get(book_id, 0) + quantity
+        in_cart[book_id] = cart_quantity
+        details[book_id] = (title, price_at_time, price)
+    
+    try:
+        # Hold cart + reordered quantity, or whatever is left of it
+        live = [book_id for book_id in requested if details[book_id][0] is not None]
+        available = hold_quantities(user_holder(user_id),
+                                    {book_id: in_cart[book_id] + requested[book_id] for book_id in live},
+                                    partial=True)
+        added = {book_id: max(min(requested[book_id], available[book_id] - in_cart[book_id]), 0)
+                 for book_id in live}
+        merge_cart_items(user_id, {book_id: quantity for book_id, quantity in added.items() if quantity})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    report = []
+    for book_id, quantity in requested.items():
+        title, price_at_time, price = details[book_id]
+        added_quantity = added.get(book_id, 0)
+        if title is None:
+            status = 'not_found'
+        elif added_quantity == quantity:
+            status = 'added'
+        elif added_quantity:
+            status = 'partial'
+        else:
+            status = 'unavailable'
+        report.append({
+            'book_id': book_id,
+            'title': title,
+            'requested': quantity,
+            'added': added_quantity,
+            'status': status,
+            'price_at_time': float(price_at_time) if price_at_time is not None else None,
+            'current_price': float(price) if price is not None else None,
+            'price_changed': price is not None and price_at_time is not None and price != price_at_time
+        })
+    return report
+
+def get_anonymous_cart_count():
+    """Number of distinct books in the anonymous visitor's cart"""
+    return anonymous_cart.count(session)
+
+def serialize_cart_line(book_id, title, author, description, price, quantity, image_url, cart_item_id=None):
+    """Cart view model consumed by the cart templates, /api/cart and the totals"""
+    line = {
+        'id': book_id,
+        'title': title,
+        'author': author,
+        'description': description,
+        'price': float(price) if price else 0.0,
+        'quantity': quantity,
+        'image_url': image_url or PLACEHOLDER_IMAGE_URL
+    }
+    if cart_item_id is not None:
+        line['cart_item_id'] = cart_item_id
+    return line
+
+PLACEHOLDER_IMAGE_URL = 'static/images/placeholder.png'
 
 def get_main_image_url(book_id):
     """Get main image URL for a book"""
-    main_image = BookImage.query.filter_by(book_id=book_id, is_main=True).first()
-    return main_image.image_url if main_image else 'static/images/placeholder.png'
+    return get_main_image_urls([book_id])[book_id]
+
+def main_image_url_column():
+    """Correlated subquery selecting a book's main image URL alongside Book columns.
+
+    Uses ix_book_images_book_main; the lowest image_id wins when a book has
+    more than one main image, matching get_main_image_urls. NULL when the
+    book has no main image.
+    """
+    return db.select(BookImage.image_url).where(
+        BookImage.book_id == Book.book_id,
+        BookImage.is_main == True
+    ).order_by(BookImage.image_id).limit(1).correlate(Book).scalar_subquery().label('main_image_url')
+
+def get_main_image_urls(book_ids):
+    """Get main image URLs for many books in a single query.
+
+    Returns a dict mapping every requested book_id to its main image URL,
+    falling back to the placeholder for books without a main image.
+    """
+    book_ids = set(book_ids)
+    image_urls = dict.fromkeys(book_ids, PLACEHOLDER_IMAGE_URL)
+    if not book_ids:
+        return image_urls
+    
+    main_images = db.session.query(BookImage.book_id, BookImage.image_url).filter(
+        BookImage.book_id.in_(book_ids),
+        BookImage.is_main == True
+    ).order_by(BookImage.image_id.desc()).all()
+    
+    # Lowest image_id wins when a book has more than one main image
+    for book_id, image_url in main_images:
+        image_urls[book_id] = image_url
+    return image_urls
+
+def attach_main_image_urls(books):
+    """Set image_url on each book object for template use (one query)"""
+    image_urls = get_main_image_urls(book.book_id for book in books if book)
+    for book in books:
+        if book:
+            book.image_url = image_urls[book.book_id]
+    return books
+
+def order_items_with_books():
+    """Loader option: an order's items (one extra query) with their books joined in"""
+    return selectinload(Order.order_items).joinedload(OrderItem.book)
+
+def sorted_order_items(order):
+    return sorted(order.order_items, key=lambda item: item.order_item_id)
+
+def book_cache_key(book_id):
+    return f'book:{book_id}'
+
+def serialize_book_summary(book, image_url):
+    """Cacheable listing entry for a book (index and search pages)"""
+    return {
+        'book_id': book.book_id,
+        'title': book.title,
+        'author': book.author,
+        'description': book.description,
+        'price': float(book.price) if book.price else 0.0,
+        'genre': book.genre,
+        'isbn': book.isbn,
+        'rating_avg': book.rating_avg,
+        'rating_count': book.rating_count,
+        'stock': book.stock,
+        'image_url': image_url
+    }
+
+def load_book_record(book_id):
+    """Build the full, JSON-serializable record for a book and its images"""
+    book = Book.query.get(book_id)
+    if not book:
+        return None
+    
+    images = BookImage.query.filter_by(book_id=book_id)\
+        .order_by(BookImage.is_main.desc(), BookImage.image_id).all()
+    main_image = next((img for img in images if img.is_main), None)
+    
+    return {
+        'book_id': book.book_id,
+        'title': book.title,
+        'author': book.author,
+        'isbn': book.isbn,
+        'publisher': book.publisher,
+        'publication_year': book.publication_year,
+        'pages': book.pages,
+        'language': book.language,
+        'description': book.description,
+        'price': float(book.price) if book.price else 0.0,
+        'delivery_date': book.delivery_date,
+        'genre': book.genre,
+        'format': book.format,
+        'rating_avg': book.rating_avg,
+        'rating_count': book.rating_count,
+        'rating_sum': book.rating_sum,
+        'rating_histogram': {str(star): count for star, count in book.rating_histogram.items()},
+        'stock': book.stock,
+        'image_url': main_image.image_url if main_image else PLACEHOLDER_IMAGE_URL,
+        'images': [{'url': img.image_url, 'is_main': bool(img.is_main)} for img in images]
+    }
+
+def get_book_record(book_id):
+    """Read-through cached book record, or None if the book does not exist"""
+    return catalog_cache.get_or_load(book_cache_key(book_id), lambda: load_book_record(book_id))
+
+def invalidate_catalog(book_ids=(), listings=True):
+    """Drop cached records for the given books, and with listings=True every cached listing.
+
+    Only bump listings when something a listing shows, filters or sorts on
+    changed; a bump empties every search page, facet set and genre registry.
+    Call after the write has been committed so a concurrent read cannot
+    repopulate the cache with pre-commit data.
+    """
+    catalog_cache.invalidate(*(book_cache_key(book_id) for book_id in set(book_ids)))
+    if listings:
+        catalog_cache.bump_listings()
+
+# Book columns shown, filtered or sorted on by listings, facets and the genre registry
+LISTING_FIELDS = ('title', 'author', 'description', 'price', 'genre', 'isbn', 'format', 'language',
+                  'publication_year')
+
+def listing_snapshot(book):
+    """The listing-visible state of a book, to tell whether an edit changes listings"""
+    values = (getattr(book, field) for field in LISTING_FIELDS)
+    # The form assigns prices as floats over the loaded Decimal
+    return tuple(float(value) if isinstance(value, Decimal) else value for value in values) \
+        + ((book.stock or 0) > 0,)
+
+def any_out_of_stock(book_ids):
+    """Whether any of the books has run out of stock (e.g. after a checkout)"""
+    return db.session.query(Book.book_id).filter(
+        Book.book_id.in_(list(book_ids)), Book.stock <= 0
+    ).first() is not None
+
+def rating_moves_listings(book_id, old_avg, new_avg):
+    """Whether a rating change can move a book in rating-sorted listings or rating facets.
+
+    It can only pass another book if some other book's average lies
+    between the old and new one (an index range probe on rating_avg).
+    """
+    if old_avg is None or new_avg is None:
+        return old_avg != new_avg
+    low, high = sorted((old_avg, new_avg))
+    if any(low < stars <= high for stars in RATING_BUCKETS):
+        return True
+    return db.session.query(Book.book_id).filter(
+        Book.book_id != book_id, Book.rating_avg.between(low, high)
+    ).first() is not None
+
+# InnoDB ignores full-text terms shorter than innodb_ft_min_token_size
+FULLTEXT_MIN_TOKEN_SIZE = 3
+
+# InnoDB's default stopword list (INNODB_FT_DEFAULT_STOPWORD); these words are
+# never indexed, so requiring one makes the whole MATCH come back empty
+FULLTEXT_STOPWORDS = frozenset({
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for',
+    'from', 'how', 'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the',
+    'this', 'to', 'was', 'what', 'when', 'where', 'who', 'will', 'with', 'und', 'www',
+})
+
+def is_mysql():
+    """Check whether the app is connected to MySQL/MariaDB"""
+    return db.engine.dialect.name in ('mysql', 'mariadb')
+
+def build_fulltext_query(query):
+    """Turn free text into a boolean-mode query requiring a prefix match on every term.
+
+    Stopwords are sent as optional terms; a query with nothing else to
+    require returns '' so the caller falls back to a LIKE scan.
+    """
+    terms = [term for term in re.findall(r'\w+', query) if len(term) >= FULLTEXT_MIN_TOKEN_SIZE]
+    required = [term for term in terms if term.lower() not in FULLTEXT_STOPWORDS]
+    if not required:
+        return ''
+    return ' '.join(f'{term}*' if term.lower() in FULLTEXT_STOPWORDS else f'+{term}*' for term in terms)
+
+def apply_text_search(books_query, query):
+    """Filter books by title, author and description, best matches first.
+
+    Uses the FULLTEXT index on MySQL. Other databases (and queries made only
+    of very short terms) fall back to a LIKE scan ranked by matched column.
+    """
+    fulltext_query = build_fulltext_query(query) if is_mysql() else ''
+    if fulltext_query:
+        relevance = match(Book.title, Book.author, Book.description,
+                          against=fulltext_query).in_boolean_mode()
+        return books_query.filter(relevance).order_by(relevance.desc(), Book.book_id)
+    
+    pattern = f"%{query}%"
+    relevance = db.case(
+        (Book.title.ilike(pattern), 3),
+        (Book.author.ilike(pattern), 2),
+        else_=1
+    )
+    return books_query.filter(
+        (Book.title.ilike(pattern)) | (Book.description.ilike(pattern)) | (Book.author.ilike(pattern))
+    ).order_by(relevance.desc(), Book.book_id)
+
+PRODUCTS_PER_PAGE = 20
+MAX_PRODUCTS_PER_PAGE = 100
+
+# Catalog sort options: (column, descending, cursor value type). Every column
+# has a composite (column, book_id) index so each page is an index range scan.
+BOOK_SORT_OPTIONS = {
+    'id': (Book.book_id, False, int),
+    'price_asc': (Book.price, False, Decimal),
+    'price_desc': (Book.price, True, Decimal),
+    'rating_desc': (Book.rating_avg, True, float),
+    'rating_asc': (Book.rating_avg, False, float),
+    'year_desc': (Book.publication_year, True, int),
+    'year_asc': (Book.publication_year, False, int),
+}
+
+def encode_cursor(state):
+    """Encode pagination state as an opaque URL-safe cursor"""
+    payload = json.dumps(state, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, raising ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(state, dict):
+        raise ValueError("Invalid cursor")
+    return state
+
+def keyset_after(column, id_column, descending, value, last_id):
+    """Filter for rows after (value, last_id) in (column, id_column) order.
+
+    NULLs sort first ascending and last descending on both MySQL and SQLite.
+    """
+    id_after = id_column < last_id if descending else id_column > last_id
+    if column is id_column:
+        return id_after
+    if value is None:
+        null_tail = column.is_(None) & id_after
+        return null_tail if descending else db.or_(null_tail, column.isnot(None))
+    beyond = column < value if descending else column > value
+    condition = db.or_(beyond, (column == value) & id_after)
+    return db.or_(condition, column.is_(None)) if descending else condition
+
+def paginate_books(books_query, sort, cursor=None, limit=PRODUCTS_PER_PAGE):
+    """Fetch one page of books and the cursor for the next page.
+
+    'relevance' keeps the order set by apply_text_search and pages by offset;
+    every other sort uses keyset pagination on (sort column, book_id), so deep
+    pages cost the same as the first. Raises ValueError for an unknown sort
+    or a cursor that does not belong to this sort.
+    """
+    state = decode_cursor(cursor) if cursor else None
+    if state is not None and state.get('sort') != sort:
+        raise ValueError("Invalid cursor")
+    
+    if sort == 'relevance':
+        offset = state.get('offset', 0) if state else 0
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError("Invalid cursor")
+        books = books_query.offset(offset).limit(limit + 1).all()
+        next_state = {'sort': sort, 'offset': offset + limit}
+    else:
+        if sort not in BOOK_SORT_OPTIONS:
+            raise ValueError("Invalid sort option")
+        column, descending, value_type = BOOK_SORT_OPTIONS[sort]
+        books_query = books_query.order_by(None)
+        if state is not None:
+            try:
+                value = state['value']
+                value = value_type(value) if value is not None else None
+                last_id = int(state['id'])
+            except (KeyError, TypeError, ArithmeticError, ValueError) as e:
+                raise ValueError("Invalid cursor") from e
+            books_query = books_query.filter(keyset_after(column, Book.book_id, descending, value, last_id))
+        
+        if descending:
+            books_query = books_query.order_by(column.desc(), Book.book_id.desc())
+        else:
+            books_query = books_query.order_by(column.asc(), Book.book_id.asc())
+        books = books_query.limit(limit + 1).all()
+        next_state = None
+        if len(books) > limit:
+            last_book = books[limit - 1]
+            next_state = {'sort': sort, 'value': getattr(last_book, column.key), 'id': last_book.book_id}
+    
+    has_more = len(books) > limit
+    next_cursor = encode_cursor(next_state) if has_more else None
+    return books[:limit], next_cursor
+
+REVIEWS_PER_PAGE = 10
+MAX_REVIEWS_PER_PAGE = 50
+
+def get_review_page(book_id, cursor=None, limit=REVIEWS_PER_PAGE):
+    """Fetch a newest-first page of a book's reviews with reviewer names.
+
+    Reviews and usernames come from one joined query, paged by keyset on
+    (created_at, review_id). Returns a list of (review, username) pairs and
+    the cursor for the next page. Raises ValueError for a malformed cursor.
+    """
+    reviews_query = db.session.query(Review, User.username)\
+        .outerjoin(User, Review.user_id == User.user_id)\
+        .filter(Review.book_id == book_id)
+    
+    if cursor:
+        state = decode_cursor(cursor)
+        try:
+            created_at = datetime.fromisoformat(state['created_at']) if state['created_at'] else None
+            last_id = int(state['id'])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
+        reviews_query = reviews_query.filter(
+            keyset_after(Review.created_at, Review.review_id, True, created_at, last_id)
+        )
+    
+    rows = reviews_query.order_by(Review.created_at.desc(), Review.review_id.desc())\
+                        .limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        last_review = rows[limit - 1][0]
+        next_cursor = encode_cursor({
+            'created_at': last_review.created_at.isoformat() if last_review.created_at else None,
+            'id': last_review.review_id
+        })
+    return rows[:limit], next_cursor
+
+def serialize_review(review, username):
+    """Review payload shared by the product detail and reviews API"""
+    return {
+        'user': username or 'Anonymous',
+        'rating': review.rating,
+        'description': review.description,
+        'created_at': review.created_at.isoformat() if review.created_at else None
+    }
+
+def record_review_rating(book_id, rating):
+    """Fold a new rating into the book's aggregates in a single UPDATE.
+
+    Runs in the caller's transaction so the review and the aggregates commit
+    together. rating_avg is assigned first: MySQL evaluates SET clauses left
+    to right, so it must only see the pre-update count and sum.
+    """
+    star_column = getattr(Book, f'rating_{rating}_count')
+    db.session.execute(
+        db.update(Book)
+        .where(Book.book_id == book_id)
+        .ordered_values(
+            (Book.rating_avg, (Book.rating_sum + rating) * 1.0 / (Book.rating_count + 1)),
+            (Book.rating_count, Book.rating_count + 1),
+            (Book.rating_sum, Book.rating_sum + rating),
+            (star_column, star_column + 1),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+def get_rating_summary(book_record):
+    """Rating statistics for display, read from the book's stored aggregates"""
+    total_reviews = book_record['rating_count'] or 0
+    histogram = {star: book_record['rating_histogram'][str(star)] for star in range(1, 6)}
+    return {
+        'avg_rating': round(book_record['rating_sum'] / total_reviews, 1) if total_reviews > 0 else 0,
+        'total_reviews': total_reviews,
+        'rating_counts': histogram,
+        'rating_percentages': {
+            star: round((count / total_reviews) * 100) if total_reviews > 0 else 0
+            for star, count in histogram.items()
+        }
+    }
+
+# Facet buckets: (value, label, min price, max price exclusive)
+PRICE_BUCKETS = [
+    ('0-10', 'Under $10', 0, 10),
+    ('10-20', '$10 to $20', 10, 20),
+    ('20-30', '$20 to $30', 20, 30),
+    ('30-50', '$30 to $50', 30, 50),
+    ('50+', '$50 & Above', 50, None),
+]
+RATING_BUCKETS = [4, 3, 2, 1]  # "N stars & up"
+
+def filter_books(books_query, filters):
+    """Apply the catalog search filters shared by /search and /api/products"""
+    if filters.get('q'):
+        books_query = apply_text_search(books_query, filters['q'])
+    if filters.get('genre'):
+        books_query = books_query.filter(Book.genre.ilike(f"%{filters['genre']}%"))
+    if filters.get('format'):
+        books_query = books_query.filter(Book.format == filters['format'])
+    if filters.get('language'):
+        books_query = books_query.filter(Book.language == filters['language'])
+    if filters.get('min_price') is not None:
+        books_query = books_query.filter(Book.price >= filters['min_price'])
+    if filters.get('max_price') is not None:
+        books_query = books_query.filter(Book.price <= filters['max_price'])
+    if filters.get('min_rating') is not None:
+        books_query = books_query.filter(Book.rating_avg >= filters['min_rating'])
+    return books_query
+
+def load_search_facets(filters):
+    """Facet counts for a search, from a single GROUP BY over the matching books.
+
+    The query groups by every facet dimension at once; per-facet counts are
+    then summed in Python. Genre, format, language and rating are
+    disjunctive: each one's counts ignore its own selection, so the other
+    choices stay visible. Price buckets follow the selected price range.
+    """
+    price_bucket = db.case(
+        (Book.price.is_(None), None),
+        *[(Book.price < max_price, value) for value, _, _, max_price in PRICE_BUCKETS if max_price is not None],
+        else_=PRICE_BUCKETS[-1][0]
+    ).label('price_bucket')
+    rating_floor = db.case(
+        *[(Book.rating_avg >= stars, stars) for stars in RATING_BUCKETS],
+        else_=0
+    ).label('rating_floor')
+    
+    cube_filters = {'q': filters.get('q'), 'min_price': filters.get('min_price'), 'max_price': filters.get('max_price')}
+    cube_query = filter_books(
+        db.session.query(Book.genre, Book.format, Book.language, price_bucket, rating_floor, db.func.count(Book.book_id)),
+        cube_filters
+    ).order_by(None)
+    rows = cube_query.group_by(
+        Book.genre, Book.format, Book.language,
+        db.literal_column('price_bucket'), db.literal_column('rating_floor')
+    ).all()
+    
+    genre_filter = (filters.get('genre') or '').lower()
+    selected = {
+        'genre': lambda row: genre_filter in (row[0] or '').lower(),
+        'format': lambda row: not filters.get('format') or row[1] == filters['format'],
+        'language': lambda row: not filters.get('language') or row[2] == filters['language'],
+        'rating': lambda row: filters.get('min_rating') is None or row[4] >= filters['min_rating'],
+    }
+    counts = {'genre': {}, 'format': {}, 'language': {}, 'price': {}, 'rating': {}}
+    positions = {'genre': 0, 'format': 1, 'language': 2, 'price': 3, 'rating': 4}
+    
+    for row in rows:
+        matched = {name: check(row) for name, check in selected.items()}
+        for facet, position in positions.items():
+            if all(ok for name, ok in matched.items() if name != facet):
+                value = row[position]
+                if value is not None and value != '':
+                    counts[facet][value] = counts[facet].get(value, 0) + row[5]
+    
+    def by_count(facet):
+        return [{'value': value, 'count': count}
+                for value, count in sorted(counts[facet].items(), key=lambda item: (-item[1], item[0]))]
+    
+    return {
+        'genre': by_count('genre'),
+        'format': by_count('format'),
+        'language': by_count('language'),
+        'price': [
+            {'value': value, 'label': label, 'min_price': min_price,
+             'max_price': round(max_price - 0.01, 2) if max_price is not None else None,
+             'count': counts['price'].get(value, 0)}
+            for value, label, min_price, max_price in PRICE_BUCKETS
+        ],
+        'rating': [
+            {'value': stars, 'label': f"{stars} star{'s' if stars != 1 else ''} & up",
+             'count': sum(count for floor, count in counts['rating'].items() if floor >= stars)}
+            for stars in RATING_BUCKETS
+        ]
+    }
+
+def get_search_facets(filters):
+    """Facet counts for a search, cached until the next catalog write"""
+    return catalog_cache.get_or_load(catalog_cache.listing_key('facets', filters),
+                                     lambda: load_search_facets(filters))
 
 def calculate_cart_totals(cart_items):
     """Calculate cart totals"""
     subtotal = sum(item['price'] * item['quantity'] for item in cart_items)
-    delivery_charge = 5.99 if 0 < subtotal < 50 else 0
+    delivery_charge = float(DELIVERY_CHARGE) if 0 < subtotal < FREE_DELIVERY_THRESHOLD else 0
     total = subtotal + delivery_charge
     return subtotal, delivery_charge, total
 
@@ -111,95 +772,121 @@ def api_health_check():
 def api_get_products():
     query = request.args.get('q', '')
     genre = request.args.get('genre', '')
+    format_filter = request.args.get('format', '')
+    language = request.args.get('language', '')
     min_price_str = request.args.get('min_price')
     max_price_str = request.args.get('max_price')
+    min_rating_str = request.args.get('min_rating')
+    sort = request.args.get('sort', 'relevance' if query else 'id')
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', PRODUCTS_PER_PAGE, type=int)
 
-    books_query = Book.query
+    if limit < 1 or limit > MAX_PRODUCTS_PER_PAGE:
+        return jsonify(error=f"limit must be between 1 and {MAX_PRODUCTS_PER_PAGE}"), 400
+    if sort == 'relevance' and not query:
+        sort = 'id'
 
-    if query:
-        books_query = books_query.filter(
-            (Book.title.ilike(f"%{query}%")) | (Book.description.ilike(f"%{query}%")) | (Book.author.ilike(f"%{query}%"))
-        )
-    if genre:
-        books_query = books_query.filter(Book.genre.ilike(f"%{genre}%"))
-    if min_price_str:
-        try:
-            min_price = float(min_price_str)
-            books_query = books_query.filter(Book.price >= min_price)
-        except ValueError:
-            return jsonify(error="Invalid min_price format"), 400
-    if max_price_str:
-        try:
-            max_price = float(max_price_str)
-            books_query = books_query.filter(Book.price <= max_price)
-        except ValueError:
-            return jsonify(error="Invalid max_price format"), 400
-
-    books = books_query.all()
-    books_data = [
-        {
-            'id': b.book_id,
-            'title': b.title,
-            'author': b.author,
-            'description': b.description,
-            'price': float(b.price) if b.price else 0.0,
-            'genre': b.genre,
-            'publisher': b.publisher,
-            'rating_avg': b.rating_avg,
-            'stock': b.stock,
-            'image_url': get_main_image_url(b.book_id)
-        } for b in books
-    ]
-    return jsonify(books_data)
+    try:
+        min_price = float(min_price_str) if min_price_str else None
+    except ValueError:
+        return jsonify(error="Invalid min_price format"), 400
+    try:
+        max_price = float(max_price_str) if max_price_str else None
+    except ValueError:
+        return jsonify(error="Invalid max_price format"), 400
+    try:
+        min_rating = int(min_rating_str) if min_rating_str else None
+    except ValueError:
+        return jsonify(error="Invalid min_rating format"), 400
+    if min_rating is not None and min_rating not in RATING_BUCKETS:
+        return jsonify(error=f"min_rating must be one of {sorted(RATING_BUCKETS)}"), 400
+
+    filters = {
+        'q': query, 'genre': genre, 'format': format_filter, 'language': language,
+        'min_price': min_price, 'max_price': max_price, 'min_rating': min_rating
+    }
+
+    def load_products_page():
+        books_query = filter_books(Book.query, filters)
+        books, next_cursor = paginate_books(books_query, sort, cursor, limit)
+        image_urls = get_main_image_urls(b.book_id for b in books)
+        books_data = [
+            {
+                'id': b.book_id,
+                'title': b.title,
+                'author': b.author,
+                'description': b.description,
+                'price': float(b.price) if b.price else 0.0,
+                'genre': b.genre,
+                'publisher': b.publisher,
+                'rating_avg': b.rating_avg,
+                'rating_count': b.rating_count,
+                'stock': b.stock,
+                'image_url': image_urls[b.book_id]
+            } for b in books
+        ]
+        return {'products': books_data, 'next_cursor': next_cursor, 'sort': sort, 'limit': limit}
+
+    cache_key = catalog_cache.listing_key('api_products', {**filters, 'sort': sort, 'cursor': cursor, 'limit': limit})
+    try:
+        page = catalog_cache.get_or_load(cache_key, load_products_page)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    
+    # Facets come from their own cache entry, shared by every page of this search
+    page = {**page, 'facets': get_search_facets(filters)}
+    return jsonify(page)
 
 @app.route('/api/products/<int:book_id>', methods=['GET'])
 def api_get_product_detail(book_id):
-    book = Book.query.get(book_id)
+    book = get_book_record(book_id)
     if not book:
         return jsonify(error="Book not found"), 404
-    
-    # Fetch images
-    main_image = BookImage.query.filter_by(book_id=book.book_id, is_main=True).first()
-    other_images = BookImage.query.filter_by(book_id=book.book_id, is_main=False).all()
-    
-    images_data = []
-    if main_image: 
-        images_data.append({'url': main_image.image_url, 'is_main': True})
-    images_data.extend([{'url': img.image_url, 'is_main': False} for img in other_images])
-
-    # Fetch reviews
-    reviews = Review.query.filter_by(book_id=book.book_id).all()
-    reviews_data = [
-        {
-            'user': User.query.get(r.user_id).username if User.query.get(r.user_id) else 'Anonymous', 
-            'rating': r.rating, 
-            'description': r.description, 
-            'created_at': r.created_at.isoformat()
-        }
-        for r in reviews
-    ]
+
+    # Fetch the first page of reviews; the rest come from the reviews endpoint
+    reviews, reviews_next_cursor = get_review_page(book_id)
+    reviews_data = [serialize_review(review, username) for review, username in reviews]
 
     book_data = {
-        'id': book.book_id,
-        'title': book.title,
-        'author': book.author,
-        'description': book.description,
-        'price': float(book.price) if book.price else 0.0,
-        'delivery_date_info': f"Expected delivery: {book.delivery_date} business days" if book.delivery_date else "Delivery info not available",
-        'genre': book.genre,
-        'publisher': book.publisher,
-        'isbn': book.isbn,
-        'publication_year': book.publication_year,
-        'pages': book.pages,
-        'language': book.language,
-        'format': book.format,
-        'rating_avg': book.rating_avg,
-        'stock': book.stock,
-        'images': images_data,
-        'reviews': reviews_data
+        'id': book['book_id'],
+        'title': book['title'],
+        'author': book['author'],
+        'description': book['description'],
+        'price': book['price'],
+        'delivery_date_info': f"Expected delivery: {book['delivery_date']} business days" if book['delivery_date'] else "Delivery info not available",
+        'genre': book['genre'],
+        'publisher': book['publisher'],
+        'isbn': book['isbn'],
+        'publication_year': book['publication_year'],
+        'pages': book['pages'],
+        'language': book['language'],
+        'format': book['format'],
+        'rating_avg': book['rating_avg'],
+        'rating_count': book['rating_count'],
+        'rating_histogram': book['rating_histogram'],
+        'stock': book['stock'],
+        'images': book['images'],
+        'reviews': reviews_data,
+        'reviews_next_cursor': reviews_next_cursor
     }
     return jsonify(book_data)
 
+@app.route('/api/products/<int:book_id>/reviews', methods=['GET'])
+def api_get_product_reviews(book_id):
+    """Newest-first review pages for a book ("load more")"""
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', REVIEWS_PER_PAGE, type=int)
+    if limit < 1 or limit > MAX_REVIEWS_PER_PAGE:
+        return jsonify(error=f"limit must be between 1 and {MAX_REVIEWS_PER_PAGE}"), 400
+    
+    try:
+        reviews, next_cursor = get_review_page(book_id, cursor, limit)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    
+    return jsonify(reviews=[serialize_review(review, username) for review, username in reviews],
+                   next_cursor=next_cursor)
+
 @app.route('/api/auth/signup', methods=['POST'])
 def api_signup():
     data = request.get_json()
@@ -232,13 +919,13 @@ def api_login():
     if not user or not user.check_password(data['password']):
         return jsonify(error="Invalid credentials"), 401
 
-    access_token = create_access_token(identity=user.user_id)
+    access_token = create_access_token(identity=str(user.user_id))
     return jsonify(access_token=access_token, user_id=user.user_id, username=user.username)
 
 @app.route('/api/cart', methods=['GET'])
 @jwt_required()
 def api_view_cart():
-    current_user_id = get_jwt_identity()
+    current_user_id = int(get_jwt_identity())
     cart_items = get_cart_items(current_user_id)
     subtotal, delivery_charge, total = calculate_cart_totals(cart_items)
     return jsonify(cart_items=cart_items, subtotal=subtotal, delivery_charge=delivery_charge, total=total)
@@ -246,7 +933,7 @@ def api_view_cart():
 @app.route('/api/cart/add/<int:book_id>', methods=['POST'])
 @jwt_required()
 def api_add_to_cart(book_id):
-    current_user_id = get_jwt_identity()
+    current_user_id = int(get_jwt_identity())
     book = Book.query.get(book_id)
     if not book:
         return jsonify(error="Book not found"), 404
@@ -257,29 +944,137 @@ def api_add_to_cart(book_id):
         return jsonify(error="Invalid quantity"), 400
 
     cart_item = CartItem.query.filter_by(user_id=current_user_id, book_id=book_id).first()
+    new_quantity = (cart_item.quantity if cart_item else 0) + quantity
+    held, available = reserve_stock(user_holder(current_user_id), book_id, new_quantity)
+    if not held:
+        db.session.rollback()
+        return jsonify(error="Insufficient stock", available=available), 409
+
     if cart_item:
-        cart_item.quantity += quantity
+        cart_item.quantity = new_quantity
     else:
         cart_item = CartItem(user_id=current_user_id, book_id=book_id, quantity=quantity)
         db.session.add(cart_item)
     db.session.commit()
     return jsonify(message="Book added to cart")
 
+@app.route('/api/orders/<int:order_id>/reorder', methods=['POST'])
+@jwt_required()
+def api_reorder(order_id):
+    """Copy a past order back into the cart; returns a per-item report and the cart"""
+    current_user_id = int(get_jwt_identity())
+    report = reorder_to_cart(current_user_id, order_id)
+    if report is None:
+        return jsonify(error="Order not found"), 404
+    
+    cart_items = get_cart_items(current_user_id)
+    subtotal, delivery_charge, total = calculate_cart_totals(cart_items)
+    return jsonify(items=report, cart_items=cart_items, subtotal=subtotal,
+                   delivery_charge=delivery_charge, total=total)
+
+CART_OPERATIONS = ('add', 'set', 'remove')
+MAX_CART_OPERATIONS = 100
+
+def parse_cart_operations(operations):
+    """Validate batch cart operations, returning (operations, error message)"""
+    if not isinstance(operations, list) or not operations:
+        return None, "operations must be a non-empty list"
+    if len(operations) > MAX_CART_OPERATIONS:
+        return None, f"At most {MAX_CART_OPERATIONS} operations per request"
+    
+    parsed = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            return None, f"Operation {index} must be an object"
+        op = operation.get('op', 'add')
+        book_id = operation.get('book_id')
+        quantity = operation.get('quantity', 1 if op == 'add' else None)
+        if op not in CART_OPERATIONS:
+            return None, f"Operation {index}: op must be one of {', '.join(CART_OPERATIONS)}"
+        if not isinstance(book_id, int) or isinstance(book_id, bool):
+            return None, f"Operation {index}: invalid book_id"
+        if op != 'remove':
+            minimum = 1 if op == 'add' else 0
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < minimum:
+                return None, f"Operation {index}: invalid quantity"
+        parsed.append((op, book_id, quantity))
+    return parsed, None
+
+@app.route('/api/cart/batch', methods=['POST'])
+@jwt_required()
+def api_batch_update_cart():
+    """Apply add/set/remove operations to the cart in one transaction.
+
+    Body: {"operations": [{"op": "add" | "set" | "remove", "book_id": 1, "quantity": 2}, ...]}
+    Operations apply in order; "set" with quantity 0 removes the book. Stock
+    for every resulting quantity is checked (and held) in one query. If any
+    book falls short nothing is applied and a 409 lists the shortfalls.
+    """
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+    operations, error = parse_cart_operations(data.get('operations'))
+    if error:
+        return jsonify(error=error), 400
+    
+    cart_rows = {row.book_id: row for row in CartItem.query.filter_by(user_id=current_user_id).all()}
+    quantities = {book_id: row.quantity for book_id, row in cart_rows.items()}
+    touched = set()
+    for op, book_id, quantity in operations:
+        touched.add(book_id)
+        if op == 'add':
+            quantities[book_id] = quantities.get(book_id, 0) + quantity
+        elif op == 'set':
+            quantities[book_id] = quantity
+        else:
+            quantities[book_id] = 0
+    
+    holder = user_holder(current_user_id)
+    wanted = {book_id: quantities[book_id] for book_id in touched if quantities[book_id] > 0}
+    removed = [book_id for book_id in touched if quantities[book_id] == 0]
+    try:
+        shortfalls = refresh_holds(holder, wanted)
+        if shortfalls:
+            db.session.rollback()
+            return jsonify(error="Insufficient stock", items=shortfalls), 409
+        
+        if removed:
+            release_holds(holder, removed)
+            CartItem.query.filter(CartItem.user_id == current_user_id, CartItem.book_id.in_(removed))\
+                          .delete(synchronize_session=False)
+        updates = [{'cart_item_id': cart_rows[book_id].cart_item_id, 'quantity': quantity}
+                   for book_id, quantity in wanted.items()
+                   if book_id in cart_rows and cart_rows[book_id].quantity != quantity]
+        inserts = [{'user_id': current_user_id, 'book_id': book_id, 'quantity': quantity, 'added_at': datetime.now()}
+                   for book_id, quantity in wanted.items() if book_id not in cart_rows]
+        if updates:
+            db.session.execute(db.update(CartItem), updates)
+        if inserts:
+            db.session.execute(db.insert(CartItem), inserts)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    cart_items = get_cart_items(current_user_id)
+    subtotal, delivery_charge, total = calculate_cart_totals(cart_items)
+    return jsonify(cart_items=cart_items, subtotal=subtotal, delivery_charge=delivery_charge, total=total)
+
 # ============================================================================
 # WEB ROUTES (Server-side rendered pages)
 # ============================================================================
 
 @app.route('/')
 def index():
-    # Get featured books from database
-    books = Book.query.limit(6).all()
+    # Get featured books (with image URLs) from the catalog cache
+    def load_featured_books():
+        books = Book.query.limit(6).all()
+        image_urls = get_main_image_urls(book.book_id for book in books)
+        return [serialize_book_summary(book, image_urls[book.book_id]) for book in books]
     
-    # Add image_url attribute to each book object for template use
-    for book in books:
-        book.image_url = get_main_image_url(book.book_id)
+    books = catalog_cache.get_or_load(catalog_cache.listing_key('featured', {}), load_featured_books)
     
-    # Get dynamic genres for homepage
-    genres = get_existing_genres()
+    # Get dynamic genres (with book counts) for homepage
+    genres = get_genre_registry()
     
     return render_template('index.html', books=books, genres=genres)
 
@@ -289,35 +1084,73 @@ def search():
     genre = request.args.get('genre', '')
     min_price = request.args.get('min_price', type=float)
     max_price = request.args.get('max_price', type=float)
+    min_rating = request.args.get('min_rating', type=int)
+    sort = request.args.get('sort', '')
+    cursor = request.args.get('cursor')
+    if sort not in BOOK_SORT_OPTIONS:
+        sort = 'relevance' if query else 'id'
+    if min_rating not in RATING_BUCKETS:
+        min_rating = None
+    
+    filters = {
+        'q': query,
+        'genre': genre,
+        'format': request.args.get('format', ''),
+        'language': request.args.get('language', ''),
+        'min_price': min_price,
+        'max_price': max_price,
+        'min_rating': min_rating
+    }
     
-    # Filter books based on search criteria
-    books_query = Book.query
+    def load_search_page(page_cursor):
+        # Filter books based on search criteria
+        books_query = filter_books(Book.query, filters)
+        books, next_cursor = paginate_books(books_query, sort, page_cursor)
+        image_urls = get_main_image_urls(book.book_id for book in books)
+        return {
+            'books': [serialize_book_summary(book, image_urls[book.book_id]) for book in books],
+            'next_cursor': next_cursor
+        }
     
-    if query:
-        books_query = books_query.filter(
-            (Book.title.ilike(f"%{query}%")) | (Book.description.ilike(f"%{query}%")) | (Book.author.ilike(f"%{query}%"))
-        )
-    if genre:
-        books_query = books_query.filter(Book.genre.ilike(f"%{genre}%"))
-    if min_price is not None:
-        books_query = books_query.filter(Book.price >= min_price)
-    if max_price is not None:
-        books_query = books_query.filter(Book.price <= max_price)
+    def cached_search_page(page_cursor):
+        cache_key = catalog_cache.listing_key('search', {**filters, 'sort': sort, 'cursor': page_cursor})
+        return catalog_cache.get_or_load(cache_key, lambda: load_search_page(page_cursor))
     
-    books = books_query.all()
+    try:
+        page = cached_search_page(cursor)
+    except ValueError:
+        # Stale or tampered cursor - start again from the first page
+        page = cached_search_page(None)
+    books = page['books']
+    
+    next_page_url = None
+    if page['next_cursor']:
+        next_page_url = url_for('search', **{**request.args.to_dict(), 'cursor': page['next_cursor']})
+    
+    def facet_url(**changes):
+        """Search URL with some filters changed; a value of None removes the filter"""
+        args = request.args.to_dict()
+        args.pop('cursor', None)
+        for name, value in changes.items():
+            if value is None:
+                args.pop(name, None)
+            else:
+                args[name] = value
+        return url_for('search', **args)
     
-    # Add image_url attribute to each book object for template use
-    for book in books:
-        book.image_url = get_main_image_url(book.book_id)
+    facets = get_search_facets(filters)
+    genre_counts = {entry['value']: entry['count'] for entry in facets['genre']}
     
     # Get existing genres for the filter dropdown
-    genres = get_existing_genres()
+    genres = get_genre_registry()
     
-    return render_template('search.html', books=books, query=query, genre=genre, genres=genres)
+    return render_template('search.html', books=books, query=query, genre=genre, genres=genres,
+                         sort=sort, next_page_url=next_page_url, facets=facets,
+                         genre_counts=genre_counts, filters=filters, facet_url=facet_url)
 
 @app.route('/book/<int:book_id>')
 def book_detail(book_id):
-    book = Book.query.get(book_id)
+    book = get_book_record(book_id)
     if not book:
         return redirect(url_for('index'))
     
@@ -333,47 +1166,25 @@ def book_detail(book_id):
         ).first()
         user_has_reviewed = existing_review is not None
     
-    # Get book images
-    images = BookImage.query.filter_by(book_id=book_id).all()
-    
-    # Get reviews
-    reviews = Review.query.filter_by(book_id=book_id).all()
+    # Get the newest reviews; older ones are loaded on demand
+    reviews, reviews_next_cursor = get_review_page(book_id)
     reviews_data = []
-    rating_counts = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-    total_rating = 0
     
-    for review in reviews:
-        user = User.query.get(review.user_id)
+    for review, username in reviews:
         reviews_data.append({
             'rating': review.rating,
             'comment': review.description,
-            'user': user.username if user else 'Anonymous',
+            'user': username or 'Anonymous',
             'created_at': review.created_at
         })
-        rating_counts[review.rating] += 1
-        total_rating += review.rating
-    
-    # Calculate rating statistics
-    total_reviews = len(reviews)
-    avg_rating = round(total_rating / total_reviews, 1) if total_reviews > 0 else 0
-    
-    # Calculate percentages for rating bars
-    rating_percentages = {}
-    for rating in range(1, 6):
-        rating_percentages[rating] = round((rating_counts[rating] / total_reviews) * 100) if total_reviews > 0 else 0
     
-    # Add image_url attribute to book object
-    book.image_url = get_main_image_url(book.book_id)
-    
-    rating_data = {
-        'avg_rating': avg_rating,
-        'total_reviews': total_reviews,
-        'rating_percentages': rating_percentages
-    }
+    # Rating statistics come from the aggregates stored on the book
+    rating_data = get_rating_summary(book)
     
     return render_template('book.html', 
                          book=book, 
                          reviews=reviews_data, 
+                         reviews_next_cursor=reviews_next_cursor,
                          rating_data=rating_data,
                          current_user=current_user,
                          user_has_reviewed=user_has_reviewed)
@@ -430,29 +1241,19 @@ def web_login():
         if not user or not user.check_password(password):
             return render_template('login.html')
         
-        # Log in user
+        # Log in user, taking over the anonymous session's stock holds
+        reservation_key = session.pop('reservation_key', None)
+        if reservation_key:
+            transfer_holds(session_holder(reservation_key), user_holder(user.user_id))
+            db.session.commit()
         session['user_id'] = user.user_id
         session['username'] = user.username
           # Transfer session cart to database if user has items in session
-        if 'cart' in session and session['cart']:
-            for item in session['cart']:
-                existing_cart_item = CartItem.query.filter_by(
-                    user_id=user.user_id, 
-                    book_id=item['id']
-                ).first()
-                
-                if existing_cart_item:
-                    existing_cart_item.quantity += item['quantity']
-                else:
-                    cart_item = CartItem(
-                        user_id=user.user_id,
-                        book_id=item['id'],
-                        quantity=item['quantity']
-                    )
-                    db.session.add(cart_item)
-            
+        session_items = anonymous_cart.load(session)
+        if session_items:
+            merge_cart_items(user.user_id, session_items)
             db.session.commit()
-            session.pop('cart', None)  # Clear session cart
+        anonymous_cart.clear(session)  # Clear session cart
         
         next_page = request.args.get('next')
         return redirect(next_page) if next_page else redirect(url_for('index'))
@@ -464,53 +1265,43 @@ def web_logout():
     session.clear()
     return redirect(url_for('index'))
 
-@app.route('/add_to_cart/<int:book_id>')
+@app.route('/add_to_cart/<int:book_id>', methods=['POST'])
 def add_to_cart(book_id):
     book = Book.query.get(book_id)
     if not book:
         return redirect(url_for('index'))
     
-    # Check stock availability
-    if book.stock <= 0:
-        return redirect(request.referrer or url_for('index'))
-    
     current_user = get_current_user()
+    holder = get_reservation_holder()
     
     if current_user:
-        # Add to database cart with stock validation
+        # Add to database cart, holding the new quantity against available stock
         cart_item = CartItem.query.filter_by(user_id=current_user.user_id, book_id=book_id).first()
+        held, _ = reserve_stock(holder, book_id, (cart_item.quantity if cart_item else 0) + 1)
+        if not held:
+            db.session.rollback()
+            return redirect(request.referrer or url_for('index'))
         if cart_item:
-            # Check if adding one more would exceed stock
-            if cart_item.quantity >= book.stock:
-                return redirect(request.referrer or url_for('index'))
             cart_item.quantity += 1
         else:
             cart_item = CartItem(user_id=current_user.user_id, book_id=book_id, quantity=1)
             db.session.add(cart_item)
         db.session.commit()
     else:
-        # Add to session cart with stock validation
-        if 'cart' not in session:
-            session['cart'] = []
-        
-        # Check if book already in cart
-        cart_item = next((item for item in session['cart'] if item['id'] == book_id), None)
-        if cart_item:
-            # Check if adding one more would exceed stock
-            if cart_item['quantity'] >= book.stock:
-                return redirect(request.referrer or url_for('index'))
-            cart_item['quantity'] += 1
+        # Add to anonymous cart, holding the new quantity against available stock
+        # up to the anonymous cap; past it the unit is only checked, not held
+        items = anonymous_cart.load(session)
+        quantity = items.get(book_id, 0) + 1
+        if sum(items.values()) < app.config['RESERVATION_ANONYMOUS_MAX_UNITS']:
+            held, _ = reserve_stock(holder, book_id, quantity)
         else:
-            session['cart'].append({
-                'id': book_id,
-                'title': book.title,
-                'author': book.author,
-                'description': book.description,
-                'price': float(book.price) if book.price else 0.0,
-                'quantity': 1,
-                'image_url': get_main_image_url(book_id)
-            })
-        session.modified = True
+            held = quantity <= get_available_stock([book_id], holder).get(book_id, 0)
+        if not held:
+            db.session.rollback()
+            return redirect(request.referrer or url_for('index'))
+        db.session.commit()
+        items[book_id] = quantity
+        anonymous_cart.save(session, items)
     
     return redirect(request.referrer or url_for('index'))
 
@@ -521,13 +1312,17 @@ def remove_from_cart(item_id):
     if current_user:        # Remove from database cart
         cart_item = CartItem.query.filter_by(cart_item_id=item_id, user_id=current_user.user_id).first()
         if cart_item:
+            release_holds(get_reservation_holder(), [cart_item.book_id])
             db.session.delete(cart_item)
             db.session.commit()
     else:
-        # Remove from session cart (item_id is actually product_id for session)
-        if 'cart' in session:
-            session['cart'] = [item for item in session['cart'] if item['id'] != item_id]
-            session.modified = True
+        # Remove from anonymous cart (item_id is actually product_id for session)
+        items = anonymous_cart.load(session)
+        if items.pop(item_id, None) is not None:
+            anonymous_cart.save(session, items)
+            if 'reservation_key' in session:
+                release_holds(get_reservation_holder(), [item_id])
+                db.session.commit()
     
     return redirect(url_for('cart'))
 
@@ -536,12 +1331,29 @@ def cart():
     current_user = get_current_user()
     cart_items = get_cart_items(current_user.user_id if current_user else None)
     subtotal, delivery_charge, total = calculate_cart_totals(cart_items)
+    # Shown once after a reorder redirects here
+    reorder = session.pop('reorder_report', None) or {}
     
     return render_template('cart.html', 
                          cart_items=cart_items, 
                          subtotal=subtotal, 
                          delivery_charge=delivery_charge, 
-                         total=total)
+                         total=total,
+                         reorder_report=reorder.get('items'),
+                         reorder_order_id=reorder.get('order_id'))
+
+@app.route('/order/<int:order_id>/reorder', methods=['POST'])
+@login_required
+def reorder(order_id):
+    """Put a past order's items back in the cart, then show the cart with what could be added"""
+    current_user = get_current_user()
+    report = reorder_to_cart(current_user.user_id, order_id)
+    if report is None:
+        return redirect(url_for('user_orders'))
+    
+    # Redirect so refreshing the cart page doesn't add the order again
+    session['reorder_report'] = {'order_id': order_id, 'items': report}
+    return redirect(url_for('cart'))
 
 @app.route('/shipping', methods=['GET', 'POST'])
 @login_required
@@ -562,36 +1374,50 @@ def shipping():
             'country': request.form.get('country'),
             'payment_method': request.form.get('payment_method')
         }
-          # Check stock availability before processing order
-        stock_issues = []
-        for item in cart_items:
-            book = Book.query.get(item['id'])
-            if not book:
-                stock_issues.append(f"Book '{item['title']}' no longer exists.")
-            elif book.stock < item['quantity']:
-                stock_issues.append(f"Only {book.stock} units of '{item['title']}' available (you requested {item['quantity']}).")
         
-        if stock_issues:
-            return redirect(url_for('cart'))
-        
-        # Process stock reduction for each item
-        try:
-            for item in cart_items:
-                book = Book.query.get(item['id'])
-                if book:
-                    book.stock -= item['quantity']
-                    if book.stock < 0:
-                        book.stock = 0  # Prevent negative stock
-            
-            # Clear cart after successful order and stock update
-            CartItem.query.filter_by(user_id=current_user.user_id).delete()
-            db.session.commit()
+        missing_fields = [name for name, value in shipping_data.items() if not value]
+        if missing_fields:
+            checkout_errors = ["Please fill in all shipping and payment details."]
+        else:
+            # Create the order and reserve stock atomically
+            try:
+                order, failures = place_order(current_user.user_id, shipping_data)
+            except Exception as e:
+                print(f"Error placing order: {e}")
+                return redirect(url_for('cart'))
             
-            return redirect(url_for('index'))
+            if order:
+                # Stock changes only reach listings when a book sells out
+                book_ids = [item.book_id for item in order.order_items]
+                invalidate_catalog(book_ids, listings=any_out_of_stock(book_ids))
+                order_stats_cache.bump_listings()
+                return redirect(url_for('user_order_detail', order_id=order.order_id))
             
-        except Exception as e:
-            db.session.rollback()
-            return redirect(url_for('cart'))
+            checkout_errors = [failure['message'] for failure in failures]
+            cart_items = get_cart_items(current_user.user_id)
+            if not cart_items:
+                return redirect(url_for('cart'))
+        
+        subtotal, delivery_charge, total = calculate_cart_totals(cart_items)
+        return render_template('shipping.html', 
+                             cart_items=cart_items,
+                             subtotal=subtotal, 
+                             delivery_charge=delivery_charge, 
+                             total=total,
+                             checkout_errors=checkout_errors)
+    
+    # Entering checkout (re)holds every cart line for a fresh hold period
+    quantities = {}
+    for item in cart_items:
+        quantities[item['id']] = quantities.get(item['id'], 0) + item['quantity']
+    shortfalls = refresh_holds(get_reservation_holder(), quantities)
+    db.session.commit()
+    titles = {item['id']: item['title'] for item in cart_items}
+    checkout_errors = [
+        f"Only {shortfall['available']} units of '{titles[shortfall['book_id']]}' available "
+        f"(you requested {shortfall['requested']})."
+        for shortfall in shortfalls
+    ]
     
     subtotal, delivery_charge, total = calculate_cart_totals(cart_items)
     
@@ -599,7 +1425,8 @@ def shipping():
                          cart_items=cart_items,
                          subtotal=subtotal, 
                          delivery_charge=delivery_charge, 
-                         total=total)
+                         total=total,
+                         checkout_errors=checkout_errors)
 
 @app.route('/forgot-password')
 def forgot_password():
@@ -609,21 +1436,34 @@ def forgot_password():
 # ADMIN HELPER FUNCTIONS
 # ============================================================================
 
-def get_existing_genres():
-    """Fetch all unique genres from existing books"""
+def load_genre_registry():
+    """Count books and in-stock books per genre in one GROUP BY query"""
+    genres = db.session.query(
+        Book.genre,
+        db.func.count(Book.book_id),
+        db.func.sum(db.case((Book.stock > 0, 1), else_=0))
+    ).filter(
+        Book.genre.isnot(None),
+        Book.genre != ''
+    ).group_by(Book.genre).order_by(Book.genre).all()
+    
+    return [
+        {'genre': genre, 'book_count': book_count, 'in_stock_count': int(in_stock_count or 0)}
+        for genre, book_count, in_stock_count in genres if genre
+    ]
+
+def get_genre_registry():
+    """Genres with book and in-stock counts, cached until the next catalog write"""
     try:
-        genres = db.session.query(Book.genre).filter(
-            Book.genre.isnot(None),
-            Book.genre != ''
-        ).distinct().order_by(Book.genre).all()
-        
-        # Convert tuples to list of strings
-        genre_list = [genre[0] for genre in genres if genre[0]]
-        return genre_list
+        return catalog_cache.get_or_load(catalog_cache.listing_key('genres', {}), load_genre_registry)
     except Exception as e:
         print(f"Error fetching genres: {e}")
         return []
 
+def get_existing_genres():
+    """Fetch all unique genres from existing books"""
+    return [entry['genre'] for entry in get_genre_registry()]
+
 # ============================================================================
 # ADMIN ROUTES (Password-based admin access)
 # ============================================================================
@@ -660,11 +1500,16 @@ def admin_dashboard():
     books = Book.query.all()
     
     # Add image_url attribute to each book object for template use
-    for book in books:
-        book.image_url = get_main_image_url(book.book_id)
+    attach_main_image_urls(books)
     
     return render_template('admin_dashboard.html', books=books)
 
+@app.route('/admin/cache/stats')
+@admin_required
+def admin_cache_stats():
+    """Catalog cache hit/miss counters"""
+    return jsonify(catalog_cache.get_stats())
+
 @app.route('/admin/summary')
 @admin_required
 def admin_summary():
@@ -684,16 +1529,16 @@ def admin_summary():
     # Low stock books (less than 10)
     low_stock_books = Book.query.filter(Book.stock < 10).order_by(Book.stock.asc()).all()
     
-    # Order Statistics
-    total_orders = Order.query.count()
-    total_revenue = db.session.query(db.func.sum(Order.total_amount)).scalar() or 0
-    
+    # Order statistics come from the sales rollups (see analytics.py)
     # Orders by status
     order_status_stats = db.session.query(
-        Order.status,
-        db.func.count(Order.order_id).label('count'),
-        db.func.sum(Order.total_amount).label('total_amount')
-    ).group_by(Order.status).all()
+        OrderDailyRollup.status,
+        db.func.sum(OrderDailyRollup.order_count).label('count'),
+        db.func.sum(OrderDailyRollup.revenue).label('total_amount')
+    ).group_by(OrderDailyRollup.status)\
+     .having(db.func.sum(OrderDailyRollup.order_count) > 0).all()
+    total_orders = sum(stat.count for stat in order_status_stats)
+    total_revenue = sum(stat.total_amount or 0 for stat in order_status_stats)
     
     # Recent orders (last 20)
     recent_orders = Order.query.order_by(Order.order_date.desc()).limit(20).all()
@@ -703,36 +1548,35 @@ def admin_summary():
         Book.title,
         Book.author,
         Book.price,
-        db.func.count(OrderItem.order_item_id).label('times_ordered'),
-        db.func.sum(OrderItem.quantity).label('total_sold')
-    ).join(OrderItem, Book.book_id == OrderItem.book_id)\
-     .group_by(Book.book_id)\
-     .order_by(db.func.sum(OrderItem.quantity).desc())\
+        BookSalesRollup.times_ordered,
+        BookSalesRollup.total_sold
+    ).join(Book, Book.book_id == BookSalesRollup.book_id)\
+     .order_by(BookSalesRollup.total_sold.desc())\
      .limit(10).all()
     
     # Monthly revenue (last 12 months)
     monthly_revenue = db.session.query(
-        db.func.strftime('%Y-%m', Order.order_date).label('month'),
-        db.func.sum(Order.total_amount).label('revenue'),
-        db.func.count(Order.order_id).label('order_count')
-    ).filter(Order.status.in_(['completed', 'delivered']))\
-     .group_by(db.func.strftime('%Y-%m', Order.order_date))\
-     .order_by(db.func.strftime('%Y-%m', Order.order_date).desc())\
+        OrderDailyRollup.month,
+        db.func.sum(OrderDailyRollup.revenue).label('revenue'),
+        db.func.sum(OrderDailyRollup.order_count).label('order_count')
+    ).filter(OrderDailyRollup.status.in_(REVENUE_STATUSES))\
+     .group_by(OrderDailyRollup.month)\
+     .order_by(OrderDailyRollup.month.desc())\
      .limit(12).all()
     
     # Customer statistics
     total_customers = User.query.count()
-    customers_with_orders = db.session.query(db.func.count(db.func.distinct(Order.user_id))).scalar() or 0
+    customers_with_orders = db.session.query(db.func.count(CustomerSpendRollup.user_id))\
+        .filter(CustomerSpendRollup.total_orders > 0).scalar() or 0
     
     # Top customers
     top_customers = db.session.query(
         User.username,
         User.email,
-        db.func.count(Order.order_id).label('total_orders'),
-        db.func.sum(Order.total_amount).label('total_spent')
-    ).join(Order, User.user_id == Order.user_id)\
-     .group_by(User.user_id)\
-     .order_by(db.func.sum(Order.total_amount).desc())\
+        CustomerSpendRollup.total_orders,
+        CustomerSpendRollup.total_spent
+    ).join(User, User.user_id == CustomerSpendRollup.user_id)\
+     .order_by(CustomerSpendRollup.total_spent.desc())\
      .limit(10).all()
     
     return render_template('admin_summary.html',
@@ -753,6 +1597,148 @@ def admin_summary():
                          customers_with_orders=customers_with_orders,
                          top_customers=top_customers)
 
+@app.route('/admin/analytics/revenue')
+@admin_required
+def admin_revenue_series():
+    """Revenue and order counts per day, week or month for completed/delivered orders"""
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in BUCKET_GRANULARITIES:
+        return jsonify(error=f"granularity must be one of {', '.join(BUCKET_GRANULARITIES)}"), 400
+    
+    try:
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else datetime.now().date()
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') \
+            else end - timedelta(days=request.args.get('days', 90, type=int))
+    except ValueError:
+        return jsonify(error="start and end must be YYYY-MM-DD dates"), 400
+    
+    series = revenue_series(granularity, start, end)
+    return jsonify(granularity=granularity, start=start.isoformat(), end=end.isoformat(), series=[
+        {'bucket': bucket if isinstance(bucket, str) else bucket.isoformat(),
+         'revenue': float(revenue), 'order_count': order_count}
+        for bucket, revenue, order_count in series
+    ])
+
+ORDERS_PER_PAGE = 20
+
+# Admin order sorts: (column, descending, cursor value type) keys, then order_id
+ORDER_SORT_OPTIONS = {
+    'date_desc': ((Order.order_date, True, datetime.fromisoformat),),
+    'date_asc': ((Order.order_date, False, datetime.fromisoformat),),
+    'amount_desc': ((Order.total_amount, True, Decimal),),
+    'amount_asc': ((Order.total_amount, False, Decimal),),
+    'status': ((Order.status, False, str), (Order.order_date, True, datetime.fromisoformat)),
+}
+
+ORDER_DATE_RANGES = {
+    'today': 0,
+    'week': 7,
+    'month': 30,
+    'quarter': 90,
+}
+
+def apply_order_filters(query, status_filter, date_filter, customer_filter):
+    """Apply the /admin/orders filters to a query over orders.
+
+    Every predicate is a plain comparison on an indexed column: date ranges
+    compare order_date itself against a start timestamp, and customers are
+    matched by username or email prefix.
+    """
+    # Apply status filter
+    if status_filter != 'all':
+        query = query.filter(Order.status == status_filter)
+    
+    # Apply date range filter: orders since midnight N days ago
+    if date_filter in ORDER_DATE_RANGES:
+        since = datetime.combine(datetime.now().date() - timedelta(days=ORDER_DATE_RANGES[date_filter]),
+                                 datetime.min.time())
+        query = query.filter(Order.order_date >= since)
+    
+    # Apply customer filter
+    if customer_filter:
+        matching_users = db.select(User.user_id).where(
+            User.username.startswith(customer_filter, autoescape=True) |
+            User.email.startswith(customer_filter, autoescape=True)
+        )
+        query = query.filter(Order.user_id.in_(matching_users))
+    return query
+
+def order_keyset_after(sort_keys, values, last_id):
+    """Filter for orders after (values..., last_id) in (sort columns..., order_id) order"""
+    (column, descending, _), value = sort_keys[0], values[0]
+    if len(sort_keys) == 1:
+        return keyset_after(column, Order.order_id, descending, value, last_id)
+    
+    # Later on the leading column, or level with it and later on the rest
+    rest = order_keyset_after(sort_keys[1:], values[1:], last_id)
+    if value is None:
+        return db.or_(column.is_(None) & rest, column.isnot(None)) if not descending \
+            else column.is_(None) & rest
+    beyond = db.or_(column < value, column.is_(None)) if descending else column > value
+    return db.or_(beyond, (column == value) & rest)
+
+def paginate_orders(orders_query, sort, cursor=None, limit=ORDERS_PER_PAGE):
+    """Fetch one page of orders, its page number and the cursor for the next page.
+
+    Pages by keyset on (sort columns, order_id), so deep pages cost the same
+    as the first. Raises ValueError for an unknown sort or a cursor that does
+    not belong to this sort.
+    """
+    if sort not in ORDER_SORT_OPTIONS:
+        raise ValueError("Invalid sort option")
+    sort_keys = ORDER_SORT_OPTIONS[sort]
+    state = decode_cursor(cursor) if cursor else None
+    if state is not None and state.get('sort') != sort:
+        raise ValueError("Invalid cursor")
+    
+    page = 1
+    if state is not None:
+        try:
+            values = [value_type(value) if value is not None else None
+                      for (_, _, value_type), value in zip(sort_keys, state['values'], strict=True)]
+            last_id = int(state['id'])
+            page = int(state['page'])
+        except (KeyError, TypeError, ArithmeticError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
+        orders_query = orders_query.filter(order_keyset_after(sort_keys, values, last_id))
+    
+    descending = sort_keys[-1][1]
+    ordering = [column.desc() if key_descending else column.asc() for column, key_descending, _ in sort_keys]
+    ordering.append(Order.order_id.desc() if descending else Order.order_id.asc())
+    orders = orders_query.order_by(*ordering).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(orders) > limit:
+        last_order = orders[limit - 1]
+        next_cursor = encode_cursor({
+            'sort': sort,
+            'values': [getattr(last_order, column.key) for column, _, _ in sort_keys],
+            'id': last_order.order_id,
+            'page': page + 1
+        })
+    return orders[:limit], page, next_cursor
+
+def load_filtered_order_stats(status_filter, date_filter, customer_filter):
+    """Count and revenue of the filtered orders in a single aggregate query"""
+    stats_query = db.session.query(
+        db.func.count(Order.order_id),
+        db.func.coalesce(db.func.sum(Order.total_amount), 0)
+    ).select_from(Order)
+    count, revenue = apply_order_filters(stats_query, status_filter, date_filter, customer_filter).one()
+    return [count, float(revenue)]
+
+def get_filtered_order_stats(status_filter, date_filter, customer_filter):
+    """Filtered order count and revenue, cached per filter when ORDER_STATS_CACHE_TTL is set"""
+    key = order_stats_cache.listing_key('order-stats', {
+        'status': status_filter,
+        'date_range': date_filter,
+        'customer': customer_filter,
+        'day': datetime.now().date().isoformat()  # relative date ranges move daily
+    })
+    return order_stats_cache.get_or_load(
+        key, lambda: load_filtered_order_stats(status_filter, date_filter, customer_filter)
+    )
+
 @app.route('/admin/orders')
 @admin_required
 def admin_orders():
@@ -763,74 +1749,36 @@ def admin_orders():
     date_filter = request.args.get('date_range', 'all')
     customer_filter = request.args.get('customer', '')
     sort_by = request.args.get('sort', 'date_desc')
-    page = request.args.get('page', 1, type=int)
-    per_page = 20  # Orders per page
+    cursor = request.args.get('cursor')
+    if sort_by not in ORDER_SORT_OPTIONS:
+        sort_by = 'date_desc'
     
     # Start with base query
-    query = Order.query
+    query = apply_order_filters(Order.query, status_filter, date_filter, customer_filter)\
+        .options(joinedload(Order.user), selectinload(Order.order_items))
     
-    # Apply status filter
-    if status_filter != 'all':
-        query = query.filter(Order.status == status_filter)
-    
-    # Apply date range filter
-    if date_filter != 'all':
-        today = datetime.now().date()
-        if date_filter == 'today':
-            query = query.filter(db.func.date(Order.order_date) == today)
-        elif date_filter == 'week':
-            week_ago = today - timedelta(days=7)
-            query = query.filter(db.func.date(Order.order_date) >= week_ago)
-        elif date_filter == 'month':
-            month_ago = today - timedelta(days=30)
-            query = query.filter(db.func.date(Order.order_date) >= month_ago)
-        elif date_filter == 'quarter':
-            quarter_ago = today - timedelta(days=90)
-            query = query.filter(db.func.date(Order.order_date) >= quarter_ago)
-    
-    # Apply customer filter
-    if customer_filter:
-        query = query.join(User).filter(
-            User.username.contains(customer_filter) |
-            User.email.contains(customer_filter)
-        )
-    
-    # Apply sorting
-    if sort_by == 'date_desc':
-        query = query.order_by(Order.order_date.desc())
-    elif sort_by == 'date_asc':
-        query = query.order_by(Order.order_date.asc())
-    elif sort_by == 'amount_desc':
-        query = query.order_by(Order.total_amount.desc())
-    elif sort_by == 'amount_asc':
-        query = query.order_by(Order.total_amount.asc())
-    elif sort_by == 'status':
-        query = query.order_by(Order.status, Order.order_date.desc())
-    
-    # Paginate results
-    orders = query.paginate(
-        page=page, 
-        per_page=per_page, 
-        error_out=False
-    )
-    
-    # Get filter statistics
-    total_orders = Order.query.count()
-    filtered_count = query.count()
+    # Keyset pagination for every sort
+    try:
+        orders, page, next_cursor = paginate_orders(query, sort_by, cursor)
+    except ValueError:
+        # Stale or tampered cursor - start again from the first page
+        orders, page, next_cursor = paginate_orders(query, sort_by)
     
-    # Order status counts for filter badges
-    status_counts = {}
-    all_statuses = db.session.query(
-        Order.status,
-        db.func.count(Order.order_id).label('count')
-    ).group_by(Order.status).all()
+    # Filtered count and revenue in one aggregate query (optionally cached)
+    filtered_count, filtered_revenue = get_filtered_order_stats(status_filter, date_filter, customer_filter)
+    total_pages = max((filtered_count + ORDERS_PER_PAGE - 1) // ORDERS_PER_PAGE, 1)
     
-    for status, count in all_statuses:
-        status_counts[status] = count
+    page_args = {'status': status_filter, 'date_range': date_filter, 'customer': customer_filter, 'sort': sort_by}
+    first_page_url = url_for('admin_orders', **page_args) if page > 1 else None
+    next_page_url = url_for('admin_orders', **page_args, cursor=next_cursor) if next_cursor else None
     
-    # Revenue summary for filtered results
-    filtered_orders = query.all()
-    filtered_revenue = sum(order.total_amount for order in filtered_orders)
+    # Order status counts for filter badges, from the sales rollups
+    status_counts = dict(db.session.query(
+        OrderDailyRollup.status,
+        db.func.sum(OrderDailyRollup.order_count)
+    ).group_by(OrderDailyRollup.status)\
+     .having(db.func.sum(OrderDailyRollup.order_count) > 0).all())
+    total_orders = sum(status_counts.values())
     
     return render_template('admin_orders.html',
                          orders=orders,
@@ -838,6 +1786,10 @@ def admin_orders():
                          date_filter=date_filter,
                          customer_filter=customer_filter,
                          sort_by=sort_by,
+                         page=page,
+                         total_pages=total_pages,
+                         first_page_url=first_page_url,
+                         next_page_url=next_page_url,
                          total_orders=total_orders,
                          filtered_count=filtered_count,
                          status_counts=status_counts,
@@ -847,16 +1799,15 @@ def admin_orders():
 @admin_required
 def admin_order_detail(order_id):
     """Admin order detail page"""
-    order = Order.query.get_or_404(order_id)
-    order_items = OrderItem.query.filter_by(order_id=order_id).all()
-    
-    # Add book details to order items
-    for item in order_items:
-        item.book = Book.query.get(item.book_id)
+    order = Order.query.options(joinedload(Order.user), order_items_with_books())\
+                       .filter_by(order_id=order_id).first_or_404()
+    order_items = sorted_order_items(order)
+    items_subtotal = sum((item.price_at_time or 0) * item.quantity for item in order_items)
     
     return render_template('admin_order_detail.html',
                          order=order,
-                         order_items=order_items)
+                         order_items=order_items,
+                         items_subtotal=items_subtotal)
 
 @app.route('/admin/order/<int:order_id>/update-status', methods=['POST'])
 @admin_required
@@ -866,13 +1817,17 @@ def admin_update_order_status(order_id):
     new_status = request.form.get('status')
     
     if new_status in ['pending', 'processing', 'shipped', 'delivered', 'completed', 'cancelled']:
+        old_status = order.status
         order.status = new_status
+        record_status_change(order, old_status)
         
         # Update delivery date for completed/delivered orders
         if new_status in ['completed', 'delivered'] and not order.delivery_date:
             order.delivery_date = datetime.now()
         
         db.session.commit()
+        # After the commit, so a concurrent request can't re-cache the old stats
+        order_stats_cache.bump_listings()
         return jsonify({'success': True, 'message': f'Order status updated to {new_status}'})
     
     return jsonify({'success': False, 'message': 'Invalid status'})
@@ -942,6 +1897,7 @@ def admin_add_book():
             db.session.add(main_image)
         
         db.session.commit()
+        invalidate_catalog()
         return redirect(url_for('admin_dashboard'))
     
     # GET request - fetch existing genres
@@ -957,6 +1913,7 @@ def admin_edit_book(book_id):
         return redirect(url_for('admin_dashboard'))
     
     if request.method == 'POST':
+        before = listing_snapshot(book)
         book.title = request.form.get('title')
         book.author = request.form.get('author')
         book.description = request.form.get('description')
@@ -978,8 +1935,10 @@ def admin_edit_book(book_id):
         
         # Update main image if provided
         image_url = request.form.get('image_url')
+        image_changed = False
         if image_url:
             main_image = BookImage.query.filter_by(book_id=book_id, is_main=True).first()
+            image_changed = main_image is None or main_image.image_url != image_url
             if main_image:
                 main_image.image_url = image_url
             else:
@@ -990,7 +1949,9 @@ def admin_edit_book(book_id):
                 )
                 db.session.add(new_image)
         
+        listings_changed = image_changed or listing_snapshot(book) != before
         db.session.commit()
+        invalidate_catalog([book_id], listings=listings_changed)
         return redirect(url_for('admin_dashboard'))
     
     # Get current main image and genres
@@ -1009,11 +1970,13 @@ def admin_delete_book(book_id):
         return redirect(url_for('admin_dashboard'))
     
     book_title = book.title
-      # Delete associated images first
+      # Delete associated images and cart stock holds first
     BookImage.query.filter_by(book_id=book_id).delete()
+    StockReservation.query.filter_by(book_id=book_id).delete()
     # Delete book
     db.session.delete(book)
     db.session.commit()
+    invalidate_catalog([book_id])
     
     return redirect(url_for('admin_dashboard'))
 
@@ -1029,7 +1992,8 @@ def inject_current_year():
 @app.context_processor
 def inject_current_user():
     """Make current user available to all templates"""
-    return {'get_current_user': get_current_user}
+    return {'get_current_user': get_current_user,
+            'get_anonymous_cart_count': get_anonymous_cart_count}
 
 @app.route('/book/<int:book_id>/review', methods=['POST'])
 @login_required
@@ -1076,9 +2040,13 @@ def add_review(book_id):
         created_at=datetime.now()
     )
     
+    old_avg = book.rating_avg
     try:
         db.session.add(new_review)
+        record_review_rating(book_id, rating)
         db.session.commit()
+        new_avg = db.session.query(Book.rating_avg).filter(Book.book_id == book_id).scalar()
+        invalidate_catalog([book_id], listings=rating_moves_listings(book_id, old_avg, new_avg))
     except Exception as e:
         db.session.rollback()
         print(f"Error adding review: {e}")
@@ -1095,28 +2063,25 @@ def user_orders():
     page = request.args.get('page', 1, type=int)
     per_page = 10
     
+    # Items and books for the whole page are loaded with the orders
     orders = Order.query.filter_by(user_id=current_user.user_id)\
+                       .options(order_items_with_books())\
                        .order_by(Order.order_date.desc())\
                        .paginate(page=page, per_page=per_page, error_out=False)
     
-    # Get order items for each order
     orders_with_items = []
     for order in orders.items:
-        order_items = OrderItem.query.filter_by(order_id=order.order_id).all()
-        
-        # Add book details to each order item
-        for item in order_items:
-            item.book = Book.query.get(item.book_id)
-            if item.book:
-                item.book.image_url = get_main_image_url(item.book_id)
-        
+        order_items = sorted_order_items(order)
         orders_with_items.append({
             'order': order,
-            'items': order_items,
+            'order_items': order_items,
             'item_count': len(order_items),
             'total_items': sum(item.quantity for item in order_items)
         })
     
+    # Resolve images for every book on the page at once
+    attach_main_image_urls([item.book for data in orders_with_items for item in data['order_items']])
+    
     return render_template('user_orders.html', 
                          orders_data=orders_with_items,
                          orders_pagination=orders,
@@ -1129,18 +2094,14 @@ def user_order_detail(order_id):
     current_user = get_current_user()
     
     # Get order (ensure it belongs to current user)
-    order = Order.query.filter_by(order_id=order_id, user_id=current_user.user_id).first()
+    order = Order.query.options(order_items_with_books())\
+                       .filter_by(order_id=order_id, user_id=current_user.user_id).first()
     if not order:
         return redirect(url_for('user_orders'))
     
-    # Get order items
-    order_items = OrderItem.query.filter_by(order_id=order_id).all()
-    
-    # Add book details and images to each order item
-    for item in order_items:
-        item.book = Book.query.get(item.book_id)
-        if item.book:
-            item.book.image_url = get_main_image_url(item.book_id)
+    # Items and books come with the order; images in one more query
+    order_items = sorted_order_items(order)
+    attach_main_image_urls([item.book for item in order_items])
     
     return render_template('user_order_detail.html',
                          order=order,
@@ -1151,4 +2112,5 @@ if __name__ == '__main__':
     with app.app_context():
         db.create_all()
         print("Bookstore database tables checked/created.")
+    start_reservation_sweeper(app)
     app.run(debug=True, port=5000)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Rating Aggregates Backfill Script
+Recomputes the per-book review aggregates (count, sum, average and star
+histogram) from the reviews table. New reviews keep the aggregates up to
+date on their own; run this once after adding the columns, or whenever the
+aggregates need to be rebuilt. Reviews written while it runs may be lost
+from the totals, so run it during a quiet period. A running app picks up the
+new values once its cached book records expire (CATALOG_CACHE_TTL).
+"""
+
+import os
+import sys
+
+# Add current directory to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from model import db, Book, Review
+
+BATCH_SIZE = 1000
+
+def compute_rating_aggregates():
+    """Aggregate every book's reviews in a single GROUP BY query"""
+    star_counts = [
+        db.func.sum(db.case((Review.rating == star, 1), else_=0))
+        for star in range(1, 6)
+    ]
+    rows = db.session.query(
+        Review.book_id,
+        db.func.count(Review.review_id),
+        db.func.sum(Review.rating),
+        *star_counts
+    ).group_by(Review.book_id).all()
+
+    aggregates = {}
+    for book_id, count, total, *stars in rows:
+        aggregates[book_id] = {
+            'rating_count': count,
+            'rating_sum': int(total or 0),
+            'rating_avg': float(total) / count if count else 0.0,
+            **{f'rating_{star}_count': int(stars[star - 1] or 0) for star in range(1, 6)}
+        }
+    return aggregates
+
+def backfill_rating_aggregates():
+    """Write the aggregates onto every book, resetting books without reviews"""
+    aggregates = compute_rating_aggregates()
+    empty = {
+        'rating_count': 0,
+        'rating_sum': 0,
+        'rating_avg': 0.0,
+        **{f'rating_{star}_count': 0 for star in range(1, 6)}
+    }
+
+    book_ids = [book_id for (book_id,) in db.session.query(Book.book_id).all()]
+    updates = [{'book_id': book_id, **aggregates.get(book_id, empty)} for book_id in book_ids]
+
+    # Bulk UPDATE by primary key, one executemany per batch
+    for start in range(0, len(updates), BATCH_SIZE):
+        db.session.execute(db.update(Book), updates[start:start + BATCH_SIZE])
+    db.session.commit()
+
+    return len(updates), len(aggregates)
+
+def main():
+    print("🔄 Backfilling book rating aggregates...")
+    print("=" * 50)
+
+    with app.app_context():
+        try:
+            total_books, reviewed_books = backfill_rating_aggregates()
+            print(f"✅ Updated {total_books:,} books ({reviewed_books:,} with reviews)")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error during backfill: {e}")
+            import traceback
+            traceback.print_exc()
+
+if __name__ == '__main__':
+    main()
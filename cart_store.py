@@ -0,0 +1,135 @@
+"""
+Storage for anonymous (logged-out) shopping carts.
+
+An anonymous cart is just an ordered mapping of book_id to quantity; book
+details are looked up in one batched query when the cart is displayed.
+Two stores are available:
+- CookieCartStore: keeps ``[[book_id, quantity], ...]`` in the signed
+  session cookie (default)
+- SQLiteCartStore: keeps carts in a local SQLite file; the cookie only
+  carries an opaque cart id
+"""
+
+import json
+import os
+import secrets
+import sqlite3
+import time
+from contextlib import contextmanager
+
+SESSION_CART_KEY = 'cart'
+SESSION_CART_ID_KEY = 'cart_id'
+
+
+def normalize_cart(entries):
+    """Parse stored entries into {book_id: quantity}.
+
+    Accepts [book_id, quantity] pairs as well as the older list of book
+    dicts, so carts saved before the compact format keep working.
+    """
+    items = {}
+    for entry in entries or []:
+        if isinstance(entry, dict):
+            book_id, quantity = entry.get('id'), entry.get('quantity')
+        elif isinstance(entry, (list, tuple)) and len(entry) == 2:
+            book_id, quantity = entry
+        else:
+            continue
+        if isinstance(book_id, int) and isinstance(quantity, int) and quantity > 0:
+            items[book_id] = items.get(book_id, 0) + quantity
+    return items
+
+
+def encode_cart(items):
+    return [[book_id, quantity] for book_id, quantity in items.items()]
+
+
+class CookieCartStore:
+    """Cart pairs stored in the session cookie itself"""
+
+    def load(self, session):
+        return normalize_cart(session.get(SESSION_CART_KEY))
+
+    def save(self, session, items):
+        if items:
+            session[SESSION_CART_KEY] = encode_cart(items)
+        else:
+            self.clear(session)
+
+    def clear(self, session):
+        session.pop(SESSION_CART_KEY, None)
+
+    def count(self, session):
+        return len(self.load(session))
+
+
+class SQLiteCartStore:
+    """Carts stored server-side in SQLite, keyed by an opaque id kept in the session"""
+
+    def __init__(self, path, ttl_seconds=30 * 24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS anonymous_carts ('
+                         'cart_id TEXT PRIMARY KEY, items TEXT NOT NULL, updated_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_anonymous_carts_updated '
+                         'ON anonymous_carts (updated_at)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def load(self, session):
+        cart_id = session.get(SESSION_CART_ID_KEY)
+        if not cart_id:
+            return {}
+        with self._connect() as conn:
+            row = conn.execute('SELECT items FROM anonymous_carts WHERE cart_id = ? AND updated_at > ?',
+                               (cart_id, time.time() - self.ttl_seconds)).fetchone()
+        return normalize_cart(json.loads(row[0])) if row else {}
+
+    def save(self, session, items):
+        if not items:
+            self.clear(session)
+            return
+        cart_id = session.get(SESSION_CART_ID_KEY)
+        if not cart_id:
+            cart_id = session[SESSION_CART_ID_KEY] = secrets.token_urlsafe(16)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('INSERT INTO anonymous_carts (cart_id, items, updated_at) VALUES (?, ?, ?) '
+                         'ON CONFLICT(cart_id) DO UPDATE SET items = excluded.items, updated_at = excluded.updated_at',
+                         (cart_id, json.dumps(encode_cart(items), separators=(',', ':')), now))
+            # Abandoned carts expire after ttl_seconds without changes
+            conn.execute('DELETE FROM anonymous_carts WHERE updated_at <= ?', (now - self.ttl_seconds,))
+
+    def clear(self, session):
+        cart_id = session.pop(SESSION_CART_ID_KEY, None)
+        if cart_id:
+            with self._connect() as conn:
+                conn.execute('DELETE FROM anonymous_carts WHERE cart_id = ?', (cart_id,))
+
+    def count(self, session):
+        return len(self.load(session))
+
+
+def create_cart_store(config):
+    """Build the anonymous cart store from app config.
+
+    ANONYMOUS_CART_STORE selects 'cookie' (default) or 'sqlite', which
+    stores carts in ANONYMOUS_CART_SQLITE_PATH.
+    """
+    store_name = config.get('ANONYMOUS_CART_STORE', 'cookie')
+    if store_name == 'cookie':
+        return CookieCartStore()
+    if store_name == 'sqlite':
+        return SQLiteCartStore(config['ANONYMOUS_CART_SQLITE_PATH'],
+                               config.get('ANONYMOUS_CART_TTL_DAYS', 30) * 24 * 3600)
+    raise ValueError(f"Unknown ANONYMOUS_CART_STORE: {store_name}")
@@ -0,0 +1,252 @@
+"""
+Read-through cache for catalog reads (books, listings, product details).
+
+Two backends are available:
+- LRUCacheBackend: in-process LRU with per-entry TTL (default)
+- SharedCacheBackend: wraps a Redis-compatible client so several app
+  processes share one cache. InMemorySharedClient is a local stand-in for
+  that client, useful for development and tests without a Redis server.
+
+Values must be JSON-serializable so they can be stored in a shared backend.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # Shared backend is optional
+    redis = None
+
+
+class LRUCacheBackend:
+    """Thread-safe in-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # Counters live outside the LRU so they are never evicted
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (hit, value) for key"""
+        with self._lock:
+            if key in self._counters:
+                return True, self._counters[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def incr(self, key):
+        """Atomically increment an integer counter, starting from 0"""
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class InMemorySharedClient:
+    """Local stand-in for the subset of the Redis client API the cache uses"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def incr(self, key):
+        with self._lock:
+            entry = self._live(key)
+            value = int(entry[0]) + 1 if entry else 1
+            self._data[key] = (str(value).encode('utf-8'), entry[1] if entry else None)
+            return value
+
+class SharedCacheBackend:
+    """Cache backend over a Redis-compatible client, values stored as JSON"""
+
+    def __init__(self, client, key_prefix='catalog:'):
+        self.client = client
+        self.key_prefix = key_prefix
+
+    def get(self, key):
+        raw = self.client.get(self.key_prefix + key)
+        if raw is None:
+            return False, None
+        return True, json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.key_prefix + key, json.dumps(value), ex=ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.key_prefix + key for key in keys))
+
+    def incr(self, key):
+        return int(self.client.incr(self.key_prefix + key))
+
+class CatalogCache:
+    """Read-through cache with hit/miss counters and generation-based listing keys.
+
+    Per-book entries are invalidated by key. Listing entries (search results,
+    product pages) embed the current listings generation in their key, so a
+    single bump_listings() makes every cached listing unreachable; stale
+    entries then age out through the LRU or their TTL.
+    """
+
+    GENERATION_KEY = 'listings:generation'
+
+    def __init__(self, backend, default_ttl=300, enabled=True):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.enabled = enabled
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats = {'hits': 0, 'misses': 0, 'sets': 0, 'invalidations': 0, 'errors': 0}
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def get_or_load(self, key, loader, ttl=None):
+        """Return the cached value for key, calling loader() and caching it on a miss.
+
+        A loader result of None is returned but not cached. Backend failures
+        are counted and fall through to the loader so the cache never takes
+        the site down.
+        """
+        if not self.enabled:
+            return loader()
+
+        try:
+            hit, value = self.backend.get(key)
+        except Exception:
+            self._count('errors')
+            hit, value = False, None
+
+        if hit:
+            self._count('hits')
+            return value
+
+        self._count('misses')
+        value = loader()
+        if value is not None:
+            try:
+                self.backend.set(key, value, ttl or self.default_ttl)
+                self._count('sets')
+            except Exception:
+                self._count('errors')
+        return value
+
+    def invalidate(self, *keys):
+        if not self.enabled or not keys:
+            return
+        try:
+            self.backend.delete(*keys)
+            self._count('invalidations', len(keys))
+        except Exception:
+            self._count('errors')
+
+    def listings_generation(self):
+        if not self.enabled:
+            return 0
+        try:
+            hit, value = self.backend.get(self.GENERATION_KEY)
+        except Exception:
+            self._count('errors')
+            return 0
+        return int(value) if hit else 0
+
+    def bump_listings(self):
+        if not self.enabled:
+            return
+        try:
+            self.backend.incr(self.GENERATION_KEY)
+            self._count('invalidations')
+        except Exception:
+            self._count('errors')
+
+    def listing_key(self, name, params):
+        """Key for a listing, scoped to the current listings generation"""
+        encoded = json.dumps(params, sort_keys=True, separators=(',', ':'))
+        return f'{name}:g{self.listings_generation()}:{encoded}'
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['backend'] = type(self.backend).__name__
+        stats['enabled'] = self.enabled
+        return stats
+
+
+def create_catalog_cache(config):
+    """Build the catalog cache from app config.
+
+    CATALOG_CACHE_BACKEND selects 'lru' (default), 'shared-local' (the
+    in-memory stand-in for a shared cache) or 'redis' (needs the redis
+    package and CATALOG_CACHE_REDIS_URL). Set it to 'none' to disable caching.
+    """
+    backend_name = config.get('CATALOG_CACHE_BACKEND', 'lru')
+    ttl = config.get('CATALOG_CACHE_TTL', 300)
+
+    if backend_name == 'none':
+        return CatalogCache(LRUCacheBackend(), ttl, enabled=False)
+    if backend_name == 'shared-local':
+        return CatalogCache(SharedCacheBackend(InMemorySharedClient()), ttl)
+    if backend_name == 'redis':
+        if redis is None:
+            raise ValueError("CATALOG_CACHE_BACKEND=redis requires the redis package")
+        client = redis.Redis.from_url(config['CATALOG_CACHE_REDIS_URL'])
+        return CatalogCache(SharedCacheBackend(client), ttl)
+    if backend_name == 'lru':
+        return CatalogCache(LRUCacheBackend(config.get('CATALOG_CACHE_MAX_ENTRIES', 1024)), ttl)
+    raise ValueError(f"Unknown CATALOG_CACHE_BACKEND: {backend_name}")
@@ -0,0 +1,143 @@
+"""
+Checkout engine: turns a user's database cart into an Order in one transaction.
+
+Stock is decremented with conditional UPDATEs (``stock = stock - qty WHERE
+stock >= qty``) issued in ascending book_id order, so concurrent checkouts
+can never oversell and always take row locks in the same order (no
+deadlocks). Units held for other shoppers (see reservations.py) are not
+sold; the buyer's own holds are consumed. Either the order, its items, the
+stock changes, the released holds and the emptied cart all commit
+together, or nothing does.
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+from model import db, Book, CartItem, Order, OrderItem
+from reservations import user_holder, held_by_others, release_holds
+from analytics import record_order
+
+# Form values from shipping.html mapped to stored payment methods
+PAYMENT_METHODS = {
+    'card': 'credit_card',
+    'paypal': 'paypal',
+    'cod': 'cash_on_delivery',
+}
+
+DELIVERY_CHARGE = Decimal('5.99')
+FREE_DELIVERY_THRESHOLD = Decimal('50')
+NEW_ORDER_STATUS = 'pending'
+
+
+def calculate_delivery_charge(subtotal):
+    """Flat delivery charge for non-empty orders under the free delivery threshold"""
+    return DELIVERY_CHARGE if 0 < subtotal < FREE_DELIVERY_THRESHOLD else Decimal('0.00')
+
+
+def format_shipping_address(shipping_data):
+    """Single-line address in the format stored on orders"""
+    region = ' '.join(part for part in (shipping_data.get('state'), shipping_data.get('postal_code')) if part)
+    parts = [
+        shipping_data.get('full_name'),
+        shipping_data.get('street_address'),
+        shipping_data.get('city'),
+        region,
+        shipping_data.get('country'),
+    ]
+    return ', '.join(part.strip() for part in parts if part and part.strip())
+
+
+def checkout_failure(reason, message, book_id=None, **details):
+    return {'book_id': book_id, 'reason': reason, 'message': message, **details}
+
+
+def place_order(user_id, shipping_data):
+    """Create an order from the user's cart.
+
+    Returns (order, failures). On success failures is empty and the
+    transaction is committed. Otherwise order is None, the transaction is
+    rolled back and failures lists every problem found, one entry per item
+    where possible, each with a reason code and a display message.
+    """
+    payment_method = PAYMENT_METHODS.get(shipping_data.get('payment_method'))
+    if payment_method is None:
+        return None, [checkout_failure('invalid_payment_method', "Please choose a valid payment method.")]
+
+    cart_rows = CartItem.query.filter_by(user_id=user_id).all()
+    if not cart_rows:
+        return None, [checkout_failure('empty_cart', "Your cart is empty.")]
+
+    quantities = {}
+    for row in cart_rows:
+        quantities[row.book_id] = quantities.get(row.book_id, 0) + row.quantity
+    books = {book.book_id: book for book in Book.query.filter(Book.book_id.in_(quantities)).all()}
+    holder = user_holder(user_id)
+    now = datetime.now()
+
+    try:
+        # Claim the cart first: a concurrent submit of the same cart finds
+        # the rows gone and fails here instead of creating a second order.
+        cart_item_ids = [row.cart_item_id for row in cart_rows]
+        claimed = CartItem.query.filter(CartItem.cart_item_id.in_(cart_item_ids))\
+                                .delete(synchronize_session=False)
+        if claimed != len(cart_item_ids):
+            db.session.rollback()
+            return None, [checkout_failure('cart_changed', "Your cart changed during checkout. Please review it and try again.")]
+
+        failures = []
+        for book_id in sorted(quantities):
+            quantity = quantities[book_id]
+            book = books.get(book_id)
+            if book is None:
+                failures.append(checkout_failure('not_found', "A book in your cart is no longer available.", book_id))
+                continue
+
+            # Stock minus other shoppers' active holds must cover the quantity
+            result = db.session.execute(
+                db.update(Book)
+                .where(Book.book_id == book_id,
+                       Book.stock - held_by_others(book_id, holder, now) >= quantity)
+                .values(stock=Book.stock - quantity)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                available = db.session.query(
+                    Book.stock - held_by_others(book_id, holder, now)
+                ).filter(Book.book_id == book_id).scalar() or 0
+                available = max(available, 0)
+                failures.append(checkout_failure(
+                    'insufficient_stock',
+                    f"Only {available} units of '{book.title}' available (you requested {quantity}).",
+                    book_id, requested=quantity, available=available
+                ))
+
+        if failures:
+            db.session.rollback()
+            return None, failures
+
+        subtotal = sum((Decimal(books[book_id].price or 0) * quantity for book_id, quantity in quantities.items()),
+                       Decimal('0.00'))
+        delivery_charge = calculate_delivery_charge(subtotal)
+
+        order = Order(
+            user_id=user_id,
+            order_date=datetime.now(),
+            status=NEW_ORDER_STATUS,
+            subtotal=subtotal,
+            delivery_charge=delivery_charge,
+            total_amount=subtotal + delivery_charge,
+            shipping_address=format_shipping_address(shipping_data),
+            payment_method=payment_method
+        )
+        order.order_items = [
+            OrderItem(book_id=book_id, quantity=quantity, price_at_time=books[book_id].price)
+            for book_id, quantity in sorted(quantities.items())
+        ]
+        db.session.add(order)
+        release_holds(holder, quantities)
+        record_order(order)
+        db.session.commit()
+        return order, []
+    except Exception:
+        db.session.rollback()
+        raise
@@ -2,12 +2,38 @@
 """
 Database to CSV Export Script
 Exports all database tables to CSV files for backup or analysis
+
+Each table is read with a single joined query on a server-side cursor and
+written row by row, so memory use stays flat however large the table is.
+
+Besides plain CSV, --format writes gzip or zstd compressed CSV, or typed
+Parquet / Arrow IPC files (prices as decimals, dates as timestamps). zstd
+needs the zstandard package and the columnar formats need pyarrow.
 """
 
 import os
+import io
 import csv
 import sys
-from datetime import datetime
+import gzip
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
 
 # Add current directory to path for imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -22,231 +48,546 @@ def create_export_directory():
         os.makedirs(export_dir)
     return export_dir
 
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+
+def csv_value(value):
+    """CSV representation of a column value: prices as floats, timestamps in ISO format.
+
+    Zero prices are written as empty fields, as the original per-row exporter did.
+    """
+    if isinstance(value, Decimal):
+        return float(value) if value else None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def stream_rows(statement, batch_size=EXPORT_BATCH_SIZE):
+    """Execute a select on a server-side cursor, yielding rows batch_size at a time"""
+    return db.session.execute(statement.execution_options(yield_per=batch_size))
+
+# Output formats and their file extensions
+EXPORT_FORMATS = {
+    'csv': '.csv',
+    'csv.gz': '.csv.gz',
+    'csv.zst': '.csv.zst',
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+# Rows per Parquet row group / Arrow record batch
+COLUMNAR_BATCH_SIZE = 50000
+
+def table_file(export_dir, table_name, export_format='csv'):
+    return os.path.join(export_dir, table_name + EXPORT_FORMATS[export_format])
+
+def open_csv_file(filename, append=False):
+    """Open a CSV file for writing text, compressed according to its extension.
+
+    Appending adds a new gzip member / zstd frame, which readers decompress
+    as one continuous stream.
+    """
+    mode = 'a' if append else 'w'
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode + 't', newline='', encoding='utf-8')
+    if filename.endswith('.zst'):
+        compressed = zstandard.ZstdCompressor().stream_writer(open(filename, mode + 'b'))
+        return io.TextIOWrapper(compressed, newline='', encoding='utf-8')
+    return open(filename, mode, newline='', encoding='utf-8')
+
+def export_query_to_csv(statement, filename, batch_size=EXPORT_BATCH_SIZE, header=True, append=False):
+    """Stream a select into a CSV file named after its column labels; returns the row count"""
+    count = 0
+    with open_csv_file(filename, append) as csvfile:
+        writer = csv.writer(csvfile)
+        if header:
+            writer.writerow(statement.selected_columns.keys())
+        for row in stream_rows(statement, batch_size):
+            writer.writerow([csv_value(value) for value in row])
+            count += 1
+    return count
+
+def arrow_type(column_type):
+    """Arrow type storing a SQL column type natively"""
+    if isinstance(column_type, db.Boolean):
+        return pa.bool_()
+    if isinstance(column_type, db.Integer):
+        return pa.int64()
+    if isinstance(column_type, db.Float):
+        return pa.float64()
+    if isinstance(column_type, db.Numeric):
+        return pa.decimal128(column_type.precision or 18, 2 if column_type.scale is None else column_type.scale)
+    if isinstance(column_type, db.DateTime):
+        return pa.timestamp('us')
+    if isinstance(column_type, db.Date):
+        return pa.date32()
+    return pa.string()
+
+def open_columnar_writer(filename, schema, export_format):
+    if export_format == 'parquet':
+        return pq.ParquetWriter(filename, schema, compression='zstd')
+    return pa.ipc.new_file(filename, schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+
+def export_query_to_columnar(statement, filename, export_format, batch_size=COLUMNAR_BATCH_SIZE):
+    """Stream a select into a typed Parquet or Arrow IPC file; returns the row count"""
+    schema = pa.schema([(name, arrow_type(column.type)) for name, column in statement.selected_columns.items()])
+    count = 0
+    with open_columnar_writer(filename, schema, export_format) as writer:
+        for rows in stream_rows(statement, batch_size).partitions():
+            columns = zip(*rows)
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            count += len(rows)
+    return count
+
+def export_query(statement, filename, export_format='csv', header=True):
+    """Export a select to filename in any of EXPORT_FORMATS; returns the row count"""
+    if export_format in COLUMNAR_FORMATS:
+        return export_query_to_columnar(statement, filename, export_format)
+    return export_query_to_csv(statement, filename, header=header)
+
+# One select per exported table, joined to the names it shows, in primary key order
+
+def books_export_query():
+    return db.select(
+        Book.book_id, Book.title, Book.author, Book.isbn, Book.publisher, Book.publication_year,
+        Book.pages, Book.language, Book.description, Book.price, Book.delivery_date,
+        Book.genre, Book.format, Book.rating_avg, Book.stock
+    ).order_by(Book.book_id)
+
+def users_export_query():
+    # Password hashes are never exported
+    return db.select(
+        User.user_id, User.username, User.email, User.first_name, User.last_name, User.mobile_number
+    ).order_by(User.user_id)
+
+def orders_export_query():
+    return db.select(
+        Order.order_id, Order.user_id,
+        db.func.coalesce(User.username, 'Unknown').label('username'),
+        Order.order_date, Order.status, Order.total_amount, Order.shipping_address, Order.payment_method
+    ).outerjoin(User, User.user_id == Order.user_id).order_by(Order.order_id)
+
+def order_items_export_query():
+    return db.select(
+        OrderItem.order_item_id, OrderItem.order_id, OrderItem.book_id,
+        db.func.coalesce(Book.title, 'Unknown').label('book_title'),
+        db.func.coalesce(Book.author, 'Unknown').label('book_author'),
+        OrderItem.quantity, OrderItem.price_at_time,
+        (OrderItem.quantity * OrderItem.price_at_time).label('total_price')
+    ).outerjoin(Book, Book.book_id == OrderItem.book_id).order_by(OrderItem.order_item_id)
+
+def reviews_export_query():
+    return db.select(
+        Review.review_id, Review.user_id,
+        db.func.coalesce(User.username, 'Unknown').label('username'),
+        Review.book_id,
+        db.func.coalesce(Book.title, 'Unknown').label('book_title'),
+        Review.rating, Review.description, Review.created_at
+    ).outerjoin(User, User.user_id == Review.user_id)\
+     .outerjoin(Book, Book.book_id == Review.book_id)\
+     .order_by(Review.review_id)
+
+def book_images_export_query():
+    return db.select(
+        BookImage.image_id, BookImage.book_id,
+        db.func.coalesce(Book.title, 'Unknown').label('book_title'),
+        BookImage.image_url, BookImage.is_main
+    ).outerjoin(Book, Book.book_id == BookImage.book_id).order_by(BookImage.image_id)
+
+def cart_items_export_query():
+    return db.select(
+        CartItem.cart_item_id, CartItem.user_id,
+        db.func.coalesce(User.username, 'Unknown').label('username'),
+        CartItem.book_id,
+        db.func.coalesce(Book.title, 'Unknown').label('book_title'),
+        CartItem.quantity, CartItem.added_at
+    ).outerjoin(User, User.user_id == CartItem.user_id)\
+     .outerjoin(Book, Book.book_id == CartItem.book_id)\
+     .order_by(CartItem.cart_item_id)
+
+# Exported tables in export order: (query builder, primary key used to split the table)
+EXPORT_TABLES = {
+    'books': (books_export_query, Book.book_id),
+    'users': (users_export_query, User.user_id),
+    'orders': (orders_export_query, Order.order_id),
+    'order_items': (order_items_export_query, OrderItem.order_item_id),
+    'reviews': (reviews_export_query, Review.review_id),
+    'book_images': (book_images_export_query, BookImage.image_id),
+    'cart_items': (cart_items_export_query, CartItem.cart_item_id),
+}
+
+def export_table(export_dir, table_name, export_format='csv'):
+    """Export one table of EXPORT_TABLES in full to <table_name>.<format extension>"""
+    filename = table_file(export_dir, table_name, export_format)
+    count = export_query(EXPORT_TABLES[table_name][0](), filename, export_format)
+    print(f"✅ Exported {count} {table_name.replace('_', ' ')} to {filename}")
+    return count
+
 def export_books_to_csv(export_dir):
     """Export all books to CSV"""
-    filename = os.path.join(export_dir, 'books.csv')
-    
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = [
-            'book_id', 'title', 'author', 'isbn', 'publisher', 'publication_year',
-            'pages', 'language', 'description', 'price', 'delivery_date', 
-            'genre', 'format', 'rating_avg', 'stock'
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        books = Book.query.all()
-        for book in books:
-            writer.writerow({
-                'book_id': book.book_id,
-                'title': book.title,
-                'author': book.author,
-                'isbn': book.isbn,
-                'publisher': book.publisher,
-                'publication_year': book.publication_year,
-                'pages': book.pages,
-                'language': book.language,
-                'description': book.description,
-                'price': float(book.price) if book.price else None,
-                'delivery_date': book.delivery_date,
-                'genre': book.genre,
-                'format': book.format,
-                'rating_avg': book.rating_avg,
-                'stock': book.stock
-            })
-    
-    print(f"✅ Exported {len(books)} books to {filename}")
-    return len(books)
+    return export_table(export_dir, 'books')
 
 def export_users_to_csv(export_dir):
     """Export all users to CSV (excluding sensitive password data)"""
-    filename = os.path.join(export_dir, 'users.csv')
-    
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = [
-            'user_id', 'username', 'email', 'first_name', 'last_name', 'mobile_number'
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        users = User.query.all()
-        for user in users:
-            writer.writerow({
-                'user_id': user.user_id,
-                'username': user.username,
-                'email': user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'mobile_number': user.mobile_number
-            })
-    
-    print(f"✅ Exported {len(users)} users to {filename}")
-    return len(users)
+    return export_table(export_dir, 'users')
 
 def export_orders_to_csv(export_dir):
     """Export all orders to CSV"""
-    filename = os.path.join(export_dir, 'orders.csv')
-    
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = [
-            'order_id', 'user_id', 'username', 'order_date', 'status', 
-            'total_amount', 'shipping_address', 'payment_method'
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        orders = Order.query.all()
-        for order in orders:
-            user = User.query.get(order.user_id)
-            writer.writerow({
-                'order_id': order.order_id,
-                'user_id': order.user_id,
-                'username': user.username if user else 'Unknown',
-                'order_date': order.order_date.isoformat() if order.order_date else None,
-                'status': order.status,
-                'total_amount': float(order.total_amount) if order.total_amount else None,
-                'shipping_address': order.shipping_address,
-                'payment_method': order.payment_method
-            })
-    
-    print(f"✅ Exported {len(orders)} orders to {filename}")
-    return len(orders)
+    return export_table(export_dir, 'orders')
 
 def export_order_items_to_csv(export_dir):
     """Export all order items to CSV"""
-    filename = os.path.join(export_dir, 'order_items.csv')
-    
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = [
-            'order_item_id', 'order_id', 'book_id', 'book_title', 'book_author',
-            'quantity', 'price_at_time', 'total_price'
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        order_items = OrderItem.query.all()
-        for item in order_items:
-            book = Book.query.get(item.book_id)
-            writer.writerow({
-                'order_item_id': item.order_item_id,
-                'order_id': item.order_id,
-                'book_id': item.book_id,
-                'book_title': book.title if book else 'Unknown',
-                'book_author': book.author if book else 'Unknown',
-                'quantity': item.quantity,
-                'price_at_time': float(item.price_at_time) if item.price_at_time else None,
-                'total_price': float(item.quantity * item.price_at_time) if item.price_at_time else None
-            })
-    
-    print(f"✅ Exported {len(order_items)} order items to {filename}")
-    return len(order_items)
+    return export_table(export_dir, 'order_items')
 
 def export_reviews_to_csv(export_dir):
     """Export all reviews to CSV"""
-    filename = os.path.join(export_dir, 'reviews.csv')
-    
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = [
-            'review_id', 'user_id', 'username', 'book_id', 'book_title',
-            'rating', 'description', 'created_at'
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        reviews = Review.query.all()
-        for review in reviews:
-            user = User.query.get(review.user_id)
-            book = Book.query.get(review.book_id)
-            writer.writerow({
-                'review_id': review.review_id,
-                'user_id': review.user_id,
-                'username': user.username if user else 'Unknown',
-                'book_id': review.book_id,
-                'book_title': book.title if book else 'Unknown',
-                'rating': review.rating,
-                'description': review.description,
-                'created_at': review.created_at.isoformat() if review.created_at else None
-            })
-    
-    print(f"✅ Exported {len(reviews)} reviews to {filename}")
-    return len(reviews)
+    return export_table(export_dir, 'reviews')
 
 def export_book_images_to_csv(export_dir):
     """Export all book images to CSV"""
-    filename = os.path.join(export_dir, 'book_images.csv')
-    
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = [
-            'image_id', 'book_id', 'book_title', 'image_url', 'is_main'
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        images = BookImage.query.all()
-        for image in images:
-            book = Book.query.get(image.book_id)
-            writer.writerow({
-                'image_id': image.image_id,
-                'book_id': image.book_id,
-                'book_title': book.title if book else 'Unknown',
-                'image_url': image.image_url,
-                'is_main': image.is_main
-            })
-    
-    print(f"✅ Exported {len(images)} book images to {filename}")
-    return len(images)
+    return export_table(export_dir, 'book_images')
 
 def export_cart_items_to_csv(export_dir):
     """Export current cart items to CSV"""
-    filename = os.path.join(export_dir, 'cart_items.csv')
+    return export_table(export_dir, 'cart_items')
+
+# Incremental export: append-mostly tables only get the rows added (and for
+# orders, changed) since the high-water marks saved in export_summary.csv.
+# A changed order is appended again, so the last row for an order_id wins
+# until the next full export compacts the files. Other tables are small and
+# rewritten in full every time.
+#
+# Keys and timestamps are assigned before the writing transaction commits, so
+# a row can become visible below a mark that has already been passed. Marks
+# therefore only advance over rows stamped at least EXPORT_SETTLE_SECONDS ago;
+# newer rows are left for the next run. Full exports still write every row:
+# the rows past their marks are counted (rows_past_mark), and the first
+# incremental run whose cutoff has passed the time the marks were read
+# (marked_at) appends them again without counting them twice.
+
+# (high-water mark column, last-changed column or None, row timestamp column)
+INCREMENTAL_EXPORTS = {
+    'orders': (Order.order_id, Order.updated_at, Order.order_date),
+    'order_items': (OrderItem.order_item_id, None, Order.order_date),
+    'reviews': (Review.created_at, None, Review.created_at),
+}
+
+EXPORT_SETTLE_SECONDS = 300
+
+SUMMARY_FIELDS = ['table_name', 'record_count', 'export_date', 'export_mode', 'file_name',
+                  'high_water_mark', 'changed_through', 'marked_at', 'rows_past_mark']
+
+def encode_mark(value):
+    if value is None:
+        return ''
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+def decode_mark(column, value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value) if isinstance(column.type, db.DateTime) else int(value)
+
+def settled_cutoff(settle_seconds=EXPORT_SETTLE_SECONDS):
+    """Rows stamped at or before this time are assumed to be committed"""
+    return datetime.now() - timedelta(seconds=settle_seconds)
+
+def current_marks(table_name, settled_before):
+    """(high-water mark, changed-through) of a table over rows stamped by settled_before"""
+    mark_column, changed_column, stamp_column = INCREMENTAL_EXPORTS[table_name]
+    mark_query = db.select(db.func.max(mark_column)).select_from(mark_column.table)
+    if stamp_column.table is not mark_column.table:
+        mark_query = mark_query.join(stamp_column.table)
+    new_mark = db.session.execute(mark_query.where(stamp_column <= settled_before)).scalar()
+    new_changed = None
+    if changed_column is not None:
+        new_changed = db.session.execute(
+            db.select(db.func.max(changed_column)).where(changed_column <= settled_before)
+        ).scalar()
+    return new_mark, new_changed
+
+def export_table_marked(export_dir, table_name, export_format='csv', settled_before=None):
+    """Full export of an incrementally exported table; returns (record_count, marks).
+
+    Every row is written. The rows past the settled high-water mark are
+    counted in the same transaction, so the next incremental run knows how
+    many of the rows it appends are already in the file.
+    """
+    mark_column = INCREMENTAL_EXPORTS[table_name][0]
+    marked_at = datetime.now()
+    new_mark, new_changed = current_marks(table_name, settled_before or settled_cutoff())
+    rows_past_mark = 0
+    if new_mark is not None:
+        rows_past_mark = db.session.execute(
+            db.select(db.func.count()).select_from(mark_column.table).where(mark_column > new_mark)
+        ).scalar()
+    count = export_table(export_dir, table_name, export_format)
+    return count, (new_mark, new_changed, marked_at, rows_past_mark)
+
+def read_export_summary(export_dir):
+    """Rows of the previous export_summary.csv by table name ({} if there is none)"""
+    filename = os.path.join(export_dir, 'export_summary.csv')
+    if not os.path.exists(filename):
+        return {}
+    with open(filename, newline='', encoding='utf-8') as csvfile:
+        return {row['table_name']: row for row in csv.DictReader(csvfile)}
+
+def export_table_incremental(export_dir, table_name, previous, export_format='csv', settled_before=None):
+    """Append the rows added or changed since the previous export of a table.
+
+    Only rows stamped by settled_before (default: EXPORT_SETTLE_SECONDS ago)
+    move the marks. Falls back to a full export when there is no previous
+    mark, or no previous file in this format.
+    Returns (record_count, appended_rows, marks), where record_count is the
+    number of distinct records the file now holds.
+    """
+    mark_column, changed_column, _ = INCREMENTAL_EXPORTS[table_name]
+    filename = table_file(export_dir, table_name, export_format)
+    previous = previous or {}
+    settled_before = settled_before or settled_cutoff()
+    old_mark = decode_mark(mark_column, previous.get('high_water_mark'))
+    if old_mark is None or previous.get('file_name') != os.path.basename(filename) or not os.path.exists(filename):
+        count, marks = export_table_marked(export_dir, table_name, export_format, settled_before)
+        return count, count, marks
     
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = [
-            'cart_item_id', 'user_id', 'username', 'book_id', 'book_title',
-            'quantity', 'added_at'
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        cart_items = CartItem.query.all()
-        for item in cart_items:
-            user = User.query.get(item.user_id)
-            book = Book.query.get(item.book_id)
-            writer.writerow({
-                'cart_item_id': item.cart_item_id,
-                'user_id': item.user_id,
-                'username': user.username if user else 'Unknown',
-                'book_id': item.book_id,
-                'book_title': book.title if book else 'Unknown',
-                'quantity': item.quantity,
-                'added_at': item.added_at.isoformat() if hasattr(item, 'added_at') and item.added_at else None
-            })
+    new_mark, new_changed = current_marks(table_name, settled_before)
+    old_changed = decode_mark(changed_column, previous.get('changed_through')) if changed_column is not None else None
+    record_count = int(previous.get('record_count') or 0)
+    rows_past_mark = int(previous.get('rows_past_mark') or 0)
+    marked_at = datetime.fromisoformat(previous['marked_at']) if previous.get('marked_at') else None
+    if rows_past_mark and settled_before < marked_at:
+        # The last full export wrote rows that have not all settled yet; until
+        # they have, the rows between the marks can't be told apart from them
+        print(f"⏳ Rows past the last full export's mark are still settling, nothing appended "
+              f"to {filename} ({record_count:,} records)")
+        return record_count, 0, (old_mark, old_changed, marked_at, rows_past_mark)
     
-    print(f"✅ Exported {len(cart_items)} cart items to {filename}")
-    return len(cart_items)
+    # Marks read first bound the delta, so the next run starts exactly where this one ends
+    new_mark = new_mark if new_mark is not None else old_mark
+    added = db.and_(mark_column > old_mark, mark_column <= new_mark)
+    delta = added
+    if changed_column is not None and new_changed is not None:
+        changed_since = changed_column > old_changed if old_changed is not None else changed_column.isnot(None)
+        delta = db.or_(added, db.and_(changed_since, changed_column <= new_changed, mark_column <= old_mark))
+    else:
+        new_changed = old_changed
+    
+    added_count = db.session.execute(db.select(db.func.count()).select_from(mark_column.table).where(added)).scalar()
+    appended = export_query_to_csv(EXPORT_TABLES[table_name][0]().where(delta), filename, header=False, append=True)
+    # The rows the last full export wrote past its mark are all in this delta again
+    record_count += added_count - rows_past_mark
+    print(f"✅ Appended {appended} new or changed {table_name.replace('_', ' ')} to {filename} "
+          f"({record_count:,} records)")
+    return record_count, appended, (new_mark, new_changed, None, 0)
+
+def export_tables_incremental(export_dir, previous, export_format='csv', settled_before=None):
+    """Incremental export of every table to CSV files; returns (stats, marks)"""
+    settled_before = settled_before or settled_cutoff()
+    stats, marks = {}, {}
+    for table_name in EXPORT_TABLES:
+        if table_name in INCREMENTAL_EXPORTS:
+            stats[table_name], _, marks[table_name] = export_table_incremental(
+                export_dir, table_name, previous.get(table_name), export_format, settled_before)
+        else:
+            stats[table_name] = export_table(export_dir, table_name, export_format)
+    return stats, marks
+
+def export_tables_full(export_dir, table_names=EXPORT_TABLES, export_format='csv', settled_before=None):
+    """Full export of some tables; returns (stats, marks) with marks for the next incremental run"""
+    settled_before = settled_before or settled_cutoff()
+    stats, marks = {}, {}
+    for table_name in table_names:
+        if table_name in INCREMENTAL_EXPORTS:
+            stats[table_name], marks[table_name] = export_table_marked(
+                export_dir, table_name, export_format, settled_before)
+        else:
+            stats[table_name] = export_table(export_dir, table_name, export_format)
+    return stats, marks
+
+# Parallel export: tables, and primary key ranges of large tables, are
+# exported by a process pool with one database connection per worker.
+
+PARALLEL_CHUNK_ROWS = 100000
+
+def init_export_worker():
+    """Drop connections inherited from the parent so each worker opens its own"""
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+def export_chunk(table_name, low, high, filename, export_format='csv'):
+    """Worker task: export rows with low <= key < high (None = unbounded) without a header.
+
+    Returns (row_count, seconds).
+    """
+    query_builder, key_column = EXPORT_TABLES[table_name]
+    statement = query_builder()
+    if low is not None:
+        statement = statement.where(key_column >= low)
+    if high is not None:
+        statement = statement.where(key_column < high)
+    started = time.monotonic()
+    with app.app_context():
+        try:
+            count = export_query(statement, filename, export_format, header=False)
+        finally:
+            db.session.remove()
+    return count, time.monotonic() - started
+
+def plan_export_chunks(table_name, chunk_rows=PARALLEL_CHUNK_ROWS):
+    """Split a table into primary key ranges of about chunk_rows rows each"""
+    _, key_column = EXPORT_TABLES[table_name]
+    low, high, count = db.session.execute(
+        db.select(db.func.min(key_column), db.func.max(key_column), db.func.count())
+    ).one()
+    if count <= chunk_rows:
+        return [(None, None)]
+    
+    chunks = -(-count // chunk_rows)
+    step = -(-(high - low + 1) // chunks)
+    bounds = [low + step * index for index in range(1, chunks)]
+    # Open-ended first and last ranges also cover rows added while exporting
+    return list(zip([None] + bounds, bounds + [None]))
+
+def merge_chunks(filename, header, chunk_files, export_format='csv'):
+    """Combine chunk files, in order, into filename (after the header, for CSV)"""
+    if export_format in COLUMNAR_FORMATS:
+        merge_columnar_chunks(filename, chunk_files, export_format)
+        return
+    
+    with open_csv_file(filename) as csvfile:
+        csv.writer(csvfile).writerow(header)
+    # Compressed chunks are complete gzip members / zstd frames, so bytes concatenate too
+    with open(filename, 'ab') as merged:
+        for chunk_file in chunk_files:
+            with open(chunk_file, 'rb') as chunk:
+                shutil.copyfileobj(chunk, merged)
+            os.remove(chunk_file)
+
+def merge_columnar_chunks(filename, chunk_files, export_format):
+    """Copy the record batches of every chunk file, in order, into one file"""
+    def read_batches(chunk_file):
+        if export_format == 'parquet':
+            yield from pq.ParquetFile(chunk_file).iter_batches(batch_size=COLUMNAR_BATCH_SIZE)
+        else:
+            with pa.ipc.open_file(chunk_file) as reader:
+                for index in range(reader.num_record_batches):
+                    yield reader.get_batch(index)
+    
+    schema = pq.read_schema(chunk_files[0]) if export_format == 'parquet' \
+        else pa.ipc.open_file(chunk_files[0]).schema
+    with open_columnar_writer(filename, schema, export_format) as writer:
+        for chunk_file in chunk_files:
+            for batch in read_batches(chunk_file):
+                writer.write_batch(batch)
+            os.remove(chunk_file)
+
+def export_tables_parallel(export_dir, workers, chunk_rows=PARALLEL_CHUNK_ROWS, export_format='csv'):
+    """Export every table with a process pool and return {table_name: row_count}.
 
-def create_summary_csv(export_dir, stats):
-    """Create a summary CSV with export statistics"""
+    Each worker reads in its own transaction, so unlike a sequential export
+    the files are not one point-in-time snapshot of the database.
+    """
+    tasks = {}
+    for table_name in EXPORT_TABLES:
+        for index, (low, high) in enumerate(plan_export_chunks(table_name, chunk_rows)):
+            chunk_file = os.path.join(export_dir, f'{table_name}.part{index:04d}{EXPORT_FORMATS[export_format]}')
+            tasks.setdefault(table_name, []).append((low, high, chunk_file))
+    db.session.remove()
+    
+    stats = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_export_worker) as pool:
+            futures = {
+                table_name: [pool.submit(export_chunk, table_name, *task, export_format) for task in table_tasks]
+                for table_name, table_tasks in tasks.items()
+            }
+            for table_name, table_futures in futures.items():
+                results = [future.result() for future in table_futures]
+                stats[table_name] = sum(count for count, _ in results)
+                filename = table_file(export_dir, table_name, export_format)
+                header = EXPORT_TABLES[table_name][0]().selected_columns.keys()
+                merge_chunks(filename, header, [chunk_file for _, _, chunk_file in tasks[table_name]],
+                             export_format)
+                
+                worker_seconds = sum(seconds for _, seconds in results)
+                rate = stats[table_name] / worker_seconds if worker_seconds > 0 else 0
+                print(f"✅ Exported {stats[table_name]:,} {table_name.replace('_', ' ')} to {filename} "
+                      f"({len(results)} chunks, {worker_seconds:.1f}s worker time, {rate:,.0f} rows/sec)")
+    finally:
+        # Chunks of a failed export are left behind only until here
+        for table_tasks in tasks.values():
+            for _, _, chunk_file in table_tasks:
+                if os.path.exists(chunk_file):
+                    os.remove(chunk_file)
+    return stats
+
+def create_summary_csv(export_dir, stats, marks=None, mode='full', previous=None, export_format='csv'):
+    """Create a summary CSV with export statistics.
+
+    marks holds the (high_water_mark, changed_through, marked_at,
+    rows_past_mark) of incrementally exported tables; tables without marks
+    get a full export next time.
+    Rows of previous for tables not in stats are kept unchanged.
+    """
     filename = os.path.join(export_dir, 'export_summary.csv')
+    marks = marks or {}
+    rows = dict(previous or {})
+    export_date = datetime.now().isoformat()
+    for table_name, count in stats.items():
+        high_water_mark, changed_through, marked_at, rows_past_mark = \
+            marks.get(table_name, (None, None, None, 0))
+        rows[table_name] = {
+            'table_name': table_name,
+            'record_count': count,
+            'export_date': export_date,
+            'export_mode': mode if table_name in INCREMENTAL_EXPORTS else 'full',
+            'file_name': os.path.basename(table_file(export_dir, table_name, export_format)),
+            'high_water_mark': encode_mark(high_water_mark),
+            'changed_through': encode_mark(changed_through),
+            'marked_at': encode_mark(marked_at) if rows_past_mark else '',
+            'rows_past_mark': rows_past_mark or ''
+        }
     
     with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['table_name', 'record_count', 'export_date']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
         writer.writeheader()
-        
-        export_date = datetime.now().isoformat()
-        
-        for table_name, count in stats.items():
-            writer.writerow({
-                'table_name': table_name,
-                'record_count': count,
-                'export_date': export_date
-            })
+        writer.writerows(rows.values())
     
     print(f"✅ Created export summary at {filename}")
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export all database tables to CSV files")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="export with this many worker processes (default: 1, sequential)")
+    parser.add_argument('--chunk-rows', type=int, default=PARALLEL_CHUNK_ROWS,
+                        help="rows per primary key range in parallel exports")
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv',
+                        help="output format (default: csv); csv.zst needs zstandard, parquet and arrow need pyarrow")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--incremental', action='store_true',
+                      help="append only rows added or changed since the last export's high-water marks")
+    mode.add_argument('--compact', action='store_true',
+                      help="rebuild full snapshots of the incrementally exported tables and reset their marks")
+    parser.add_argument('--settle-seconds', type=int, default=EXPORT_SETTLE_SECONDS,
+                        help="leave orders, order items and reviews newer than this to the next run, in case "
+                             f"their transactions are still open (default: {EXPORT_SETTLE_SECONDS})")
+    args = parser.parse_args(argv)
+    if args.workers > 1 and (args.incremental or args.compact):
+        parser.error("--incremental and --compact run sequentially; drop --workers")
+    if args.format == 'csv.zst' and zstandard is None:
+        parser.error("--format csv.zst requires the zstandard package")
+    if args.format in COLUMNAR_FORMATS and pa is None:
+        parser.error(f"--format {args.format} requires the pyarrow package")
+    if args.format in COLUMNAR_FORMATS and args.incremental:
+        parser.error("--incremental appends to CSV files; use csv, csv.gz or csv.zst")
+    return args
+
+def main(argv=None):
     """Main export function"""
+    args = parse_args(argv)
     print("🔄 Starting Database Export to CSV...")
     print("=" * 50)
     
@@ -258,19 +599,35 @@ def main():
         
         # Track statistics
         stats = {}
+        marks = {}
+        previous = None
+        mode = 'full'
         
         # Export each table
         try:
-            stats['books'] = export_books_to_csv(export_dir)
-            stats['users'] = export_users_to_csv(export_dir)
-            stats['orders'] = export_orders_to_csv(export_dir)
-            stats['order_items'] = export_order_items_to_csv(export_dir)
-            stats['reviews'] = export_reviews_to_csv(export_dir)
-            stats['book_images'] = export_book_images_to_csv(export_dir)
-            stats['cart_items'] = export_cart_items_to_csv(export_dir)
+            started = time.monotonic()
+            if args.workers > 1:
+                # Chunks are read in separate transactions, so no marks are
+                # recorded and the next incremental run starts with a full export
+                print(f"⚡ Parallel export with {args.workers} workers")
+                stats = export_tables_parallel(export_dir, args.workers, args.chunk_rows, args.format)
+            elif args.incremental:
+                print("➕ Incremental export since the last high-water marks")
+                mode = 'incremental'
+                stats, marks = export_tables_incremental(export_dir, read_export_summary(export_dir), args.format,
+                                                         settled_cutoff(args.settle_seconds))
+            elif args.compact:
+                print("🧹 Compacting incremental exports into full snapshots")
+                previous = read_export_summary(export_dir)
+                stats, marks = export_tables_full(export_dir, list(INCREMENTAL_EXPORTS), args.format,
+                                                  settled_cutoff(args.settle_seconds))
+            else:
+                stats, marks = export_tables_full(export_dir, export_format=args.format,
+                                                  settled_before=settled_cutoff(args.settle_seconds))
+            elapsed = time.monotonic() - started
             
             # Create summary
-            create_summary_csv(export_dir, stats)
+            create_summary_csv(export_dir, stats, marks, mode, previous, args.format)
             
             print()
             print("=" * 50)
@@ -281,7 +638,8 @@ def main():
                 print(f"   • {table.title().replace('_', ' ')}: {count:,} records")
                 total_records += count
             
-            print(f"\n📈 Total Records Exported: {total_records:,}")
+            print(f"\n📈 Total Records Exported: {total_records:,} in {elapsed:.1f}s "
+                  f"({total_records / elapsed if elapsed > 0 else 0:,.0f} rows/sec)")
             print(f"📁 Files saved to: {export_dir}")
             print("\n💡 You can now:")
             print("   - Open CSV files in Excel or Google Sheets")
@@ -15,6 +15,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app import app, db
 from model import User, Book, Order, OrderItem
+from analytics import rebuild_rollups
 
 class RealisticOrderGenerator:
     def __init__(self):
@@ -279,7 +280,7 @@ class RealisticOrderGenerator:
         print("=" * 50)
         
         with app.app_context():
-            from sqlalchemy import func, extract
+            from sqlalchemy import func
             
             # Basic counts
             total_orders = Order.query.count()
@@ -293,14 +294,14 @@ class RealisticOrderGenerator:
             # Monthly breakdown
             print(f"\n📅 MONTHLY ORDER BREAKDOWN")
             monthly_stats = db.session.query(
-                extract('year', Order.order_date).label('year'),
-                extract('month', Order.order_date).label('month'),
+                Order.order_month,
                 func.count(Order.order_id).label('order_count'),
                 func.sum(Order.total_amount).label('revenue')
-            ).group_by('year', 'month').order_by('year', 'month').all()
+            ).filter(Order.order_month.isnot(None))\
+             .group_by(Order.order_month).order_by(Order.order_month).all()
             
             for stat in monthly_stats[-12:]:  # Last 12 months
-                month_name = datetime(int(stat.year), int(stat.month), 1).strftime('%B %Y')
+                month_name = datetime.strptime(stat.order_month, '%Y-%m').strftime('%B %Y')
                 revenue = float(stat.revenue) if stat.revenue else 0
                 print(f"   {month_name}: {stat.order_count} orders, ${revenue:.2f}")
             
@@ -352,6 +353,11 @@ def main():
     success = generator.generate_realistic_orders(num_months=12, base_orders_per_month=60)
     
     if success:
+        # Bring the admin summary rollups up to date with the new orders
+        with app.app_context():
+            rebuild_rollups()
+        print("📊 Sales rollups rebuilt")
+        
         # Generate analytics summary
         generator.generate_analytics_summary()
         print(f"\n✅ Order generation complete!")
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+CSV to Database Import Script
+Restores books, users, orders and order items from the files written by
+export_database_to_csv.py (plain, gzip or zstd CSV) into empty tables.
+
+Rows are loaded with batched multi-row INSERTs on a single connection and
+the row counts are checked against export_summary.csv afterwards. With
+--defer-indexes, secondary indexes are dropped during the load and rebuilt
+once at the end; on MySQL foreign key and unique checks are also switched
+off for the load. Exported users carry no password hash, so restored users
+get an unusable one and must reset their password. Reviews are not imported,
+so restored books start unrated: the exported rating_avg is ignored and all
+rating aggregates keep their defaults.
+"""
+
+import os
+import io
+import csv
+import sys
+import gzip
+import time
+import secrets
+import argparse
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Add current directory to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from model import db, bcrypt, User, Book, Order, OrderItem
+from export_database_to_csv import create_export_directory, read_export_summary
+from analytics import rebuild_rollups
+
+# Importable tables in load order (parents before children)
+IMPORT_TABLES = {
+    'books': Book,
+    'users': User,
+    'orders': Order,
+    'order_items': OrderItem,
+}
+
+# Exported columns left at their defaults. Book rating aggregates are kept in
+# step with the reviews, which are not imported.
+SKIPPED_COLUMNS = {
+    'books': {'rating_avg'},
+}
+
+DEFAULT_BATCH_SIZE = 5000
+
+def open_csv_reader(filename):
+    """Open a CSV export for reading text, decompressing according to its extension"""
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rt', newline='', encoding='utf-8')
+    if filename.endswith('.zst'):
+        if zstandard is None:
+            raise ValueError(f"Reading {filename} requires the zstandard package")
+        raw = open(filename, 'rb')
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(stream, newline='', encoding='utf-8')
+    return open(filename, newline='', encoding='utf-8')
+
+def parse_value(column, value):
+    """Convert a CSV field back to the column's Python type ('' is NULL)"""
+    if value == '':
+        return None if column.nullable or not isinstance(column.type, db.String) else ''
+    column_type = column.type
+    if isinstance(column_type, db.Boolean):
+        return value == 'True'
+    if isinstance(column_type, db.Integer):
+        return int(value)
+    if isinstance(column_type, db.Float):
+        return float(value)
+    if isinstance(column_type, db.Numeric):
+        return Decimal(value)
+    if isinstance(column_type, db.DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column_type, db.Date):
+        return datetime.fromisoformat(value).date()
+    return value
+
+def read_rows(filename, table, defaults=None, skip=()):
+    """Yield dicts of the file's columns that exist in the table, typed for inserting.
+
+    Columns the export adds for readability (usernames, book titles,
+    totals) are not table columns and are skipped, as are the columns in skip.
+    """
+    with open_csv_reader(filename) as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader)
+        columns = [(index, table.c[name]) for index, name in enumerate(header)
+                   if name in table.c and name not in skip]
+        for record in reader:
+            row = dict(defaults or {})
+            row.update((column.key, parse_value(column, record[index])) for index, column in columns)
+            yield row
+
+def insert_statement(table, upsert):
+    """Plain INSERT, or an upsert where a later row for the same key wins"""
+    if not upsert:
+        return db.insert(table)
+    key_columns = [column.name for column in table.primary_key]
+    if db.engine.dialect.name in ('mysql', 'mariadb'):
+        stmt = mysql_insert(table)
+        return stmt.on_duplicate_key_update({
+            column.name: stmt.inserted[column.name] for column in table.c if column.name not in key_columns
+        })
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column.name: stmt.excluded[column.name] for column in table.c if column.name not in key_columns}
+    )
+
+def load_rows(connection, table, rows, batch_size=DEFAULT_BATCH_SIZE, upsert=False):
+    """executemany the rows in batches, committing each batch; returns the rows read"""
+    statement = insert_statement(table, upsert)
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            connection.execute(statement, batch)
+            connection.commit()
+            count += len(batch)
+            batch = []
+    if batch:
+        connection.execute(statement, batch)
+        connection.commit()
+        count += len(batch)
+    return count
+
+def deferrable_indexes(table):
+    """Secondary indexes that can be rebuilt after the load.
+
+    Indexes leading with a foreign key column are kept: MySQL may be using
+    them to enforce the constraint.
+    """
+    return [index for index in table.indexes
+            if not index.unique and index.columns and not list(index.columns)[0].foreign_keys]
+
+def set_load_checks(connection, enabled):
+    """Switch MySQL foreign key and unique checks for this connection"""
+    if db.engine.dialect.name in ('mysql', 'mariadb'):
+        value = 1 if enabled else 0
+        connection.exec_driver_sql(f"SET FOREIGN_KEY_CHECKS = {value}")
+        connection.exec_driver_sql(f"SET UNIQUE_CHECKS = {value}")
+
+def import_table(connection, import_dir, table_name, summary_row, batch_size=DEFAULT_BATCH_SIZE):
+    """Load one exported table; returns the number of rows read"""
+    table = IMPORT_TABLES[table_name].__table__
+    filename = os.path.join(import_dir, (summary_row or {}).get('file_name') or f'{table_name}.csv')
+    if not os.path.exists(filename):
+        raise FileNotFoundError(f"No export file for {table_name}: {filename}")
+
+    defaults = None
+    if table_name == 'users':
+        # One hash of a random secret: valid for bcrypt, but matches no password
+        defaults = {'password_hash': bcrypt.generate_password_hash(secrets.token_urlsafe(32)).decode('utf-8')}
+
+    # Incremental exports append changed rows again; the last one for a key wins
+    upsert = (summary_row or {}).get('export_mode') == 'incremental'
+    started = time.monotonic()
+    rows = read_rows(filename, table, defaults, SKIPPED_COLUMNS.get(table_name, ()))
+    count = load_rows(connection, table, rows, batch_size, upsert)
+    elapsed = time.monotonic() - started
+    print(f"✅ Imported {count:,} rows into {table_name} from {filename} "
+          f"({elapsed:.1f}s, {count / elapsed if elapsed > 0 else 0:,.0f} rows/sec)")
+    return count
+
+def verify_row_counts(connection, table_names, summary):
+    """Compare each table's row count with export_summary.csv; returns the mismatched tables"""
+    mismatched = []
+    for table_name in table_names:
+        table = IMPORT_TABLES[table_name].__table__
+        actual = connection.execute(db.select(db.func.count()).select_from(table)).scalar()
+        expected = summary.get(table_name, {}).get('record_count')
+        if expected in (None, ''):
+            print(f"⚠️  {table_name}: {actual:,} rows (not in export_summary.csv)")
+        elif int(expected) == actual:
+            print(f"✅ {table_name}: {actual:,} rows, matches export_summary.csv")
+        else:
+            print(f"❌ {table_name}: {actual:,} rows, export_summary.csv lists {int(expected):,}")
+            mismatched.append(table_name)
+    return mismatched
+
+def import_tables(import_dir, table_names, batch_size=DEFAULT_BATCH_SIZE, defer_indexes=False):
+    """Load the given tables into empty database tables; returns the mismatched tables"""
+    summary = read_export_summary(import_dir)
+    with db.engine.connect() as connection:
+        for table_name in table_names:
+            table = IMPORT_TABLES[table_name].__table__
+            if connection.execute(db.select(db.literal(1)).select_from(table).limit(1)).first():
+                raise ValueError(f"Table {table_name} is not empty; restore into a fresh database")
+
+        deferred = []
+        if defer_indexes:
+            deferred = [index for table_name in table_names
+                        for index in deferrable_indexes(IMPORT_TABLES[table_name].__table__)]
+            for index in deferred:
+                index.drop(connection)
+            connection.commit()
+            set_load_checks(connection, False)
+
+        try:
+            for table_name in table_names:
+                import_table(connection, import_dir, table_name, summary.get(table_name), batch_size)
+        finally:
+            if defer_indexes:
+                set_load_checks(connection, True)
+                started = time.monotonic()
+                for index in deferred:
+                    index.create(connection)
+                connection.commit()
+                print(f"✅ Rebuilt {len(deferred)} indexes in {time.monotonic() - started:.1f}s")
+
+        return verify_row_counts(connection, table_names, summary)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Restore exported CSV files into the database")
+    parser.add_argument('--dir', default=None,
+                        help="directory holding the export (default: database_exports)")
+    parser.add_argument('--tables', nargs='+', choices=list(IMPORT_TABLES), default=list(IMPORT_TABLES),
+                        help="tables to import (default: all importable tables)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"rows per INSERT batch and commit (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument('--defer-indexes', action='store_true',
+                        help="drop secondary indexes during the load and rebuild them afterwards")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Main import function"""
+    args = parse_args(argv)
+    print("🔄 Starting Database Import from CSV...")
+    print("=" * 50)
+
+    with app.app_context():
+        import_dir = args.dir or create_export_directory()
+        print(f"📁 Import directory: {import_dir}")
+        print()
+
+        # Keep the load order whatever order the tables were given in
+        table_names = [table_name for table_name in IMPORT_TABLES if table_name in args.tables]
+        try:
+            db.create_all()
+            mismatched = import_tables(import_dir, table_names, args.batch_size, args.defer_indexes)
+            if 'orders' in table_names:
+                rebuild_rollups()
+                print("✅ Rebuilt order date buckets and sales rollups")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error during import: {e}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
+
+        print()
+        print("=" * 50)
+        if mismatched:
+            print(f"❌ Row counts differ from export_summary.csv for: {', '.join(mismatched)}")
+            sys.exit(1)
+        print("🎉 DATABASE IMPORT COMPLETED SUCCESSFULLY!")
+        print("\n💡 Restored users have no usable password and must reset it before logging in.")
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from datetime import datetime, timezone
 from flask_bcrypt import Bcrypt
 from dotenv import load_dotenv
@@ -55,6 +56,30 @@ class Book(db.Model):
     format = db.Column(db.String(50), default='Paperback')  # Paperback, Hardcover, eBook
     rating_avg = db.Column(db.Float, default=0.0)
     stock = db.Column(db.Integer, default=0)
+    
+    # Review aggregates, maintained on every new review (see record_review_rating)
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_1_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        # Full-text index backing catalog search (MySQL only)
+        db.Index('ft_books_search', 'title', 'author', 'description',
+                 mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+        # Keyset pagination for the catalog sort options
+        db.Index('ix_books_price_id', 'price', 'book_id'),
+        db.Index('ix_books_rating_id', 'rating_avg', 'book_id'),
+        db.Index('ix_books_year_id', 'publication_year', 'book_id'),
+    )
+
+    @property
+    def rating_histogram(self):
+        """Number of reviews per star rating, keyed 1-5"""
+        return {star: getattr(self, f'rating_{star}_count') or 0 for star in range(1, 6)}
 
 class BookImage(db.Model):
     __tablename__ = 'book_images'
@@ -63,6 +88,10 @@ class BookImage(db.Model):
     image_url = db.Column(db.Text)
     is_main = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        db.Index('ix_book_images_book_main', 'book_id', 'is_main'),
+    )
+
 class Review(db.Model):
     __tablename__ = 'reviews'
     review_id = db.Column(db.Integer, primary_key=True)
@@ -72,8 +101,13 @@ class Review(db.Model):
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
 
+    # Relationships
+    user = db.relationship('User')
+
     __table_args__ = (
         db.CheckConstraint('rating >= 1 AND rating <= 5', name='rating_range'),
+        # Newest-first review pages per book
+        db.Index('ix_reviews_book_created', 'book_id', 'created_at'),
     )
 
 class CartItem(db.Model):
@@ -84,6 +118,26 @@ class CartItem(db.Model):
     quantity = db.Column(db.Integer, default=1)
     added_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
 
+    __table_args__ = (
+        # One row per book per cart; the login cart merge upserts on it
+        db.UniqueConstraint('user_id', 'book_id', name='uq_cart_items_user_book'),
+    )
+
+class StockReservation(db.Model):
+    __tablename__ = 'stock_reservations'
+    reservation_id = db.Column(db.Integer, primary_key=True)
+    holder = db.Column(db.String(80), nullable=False)  # 'user:<user_id>' or 'session:<key>'
+    book_id = db.Column(db.Integer, db.ForeignKey('books.book_id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('holder', 'book_id', name='uq_stock_reservations_holder_book'),
+        # Active holds per book (available-to-sell) and the expiry sweep
+        db.Index('ix_stock_reservations_book_expires', 'book_id', 'expires_at'),
+        db.Index('ix_stock_reservations_expires', 'expires_at'),
+    )
+
 class Order(db.Model):
     __tablename__ = 'orders'
     order_id = db.Column(db.Integer, primary_key=True)
@@ -97,10 +151,32 @@ class Order(db.Model):
     shipping_address = db.Column(db.Text)
     payment_method = db.Column(db.String(50))  # credit_card, debit_card, paypal, cash_on_delivery
     tracking_number = db.Column(db.String(100))
+    # Date buckets of order_date for analytics range scans, kept in step by set_order_buckets
+    order_day = db.Column(db.Date, index=True)
+    order_month = db.Column(db.String(7), index=True)  # YYYY-MM
+    # Last change to the order row, for incremental exports (NULL until first changed)
+    updated_at = db.Column(db.DateTime, onupdate=datetime.now, index=True)
     
     # Relationships
     user = db.relationship('User', backref='orders')
     order_items = db.relationship('OrderItem', backref='order', cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # Filtered, keyset-paginated admin order list (order_id breaks ties)
+        db.Index('ix_orders_date_id', 'order_date', 'order_id'),
+        # Matches the status sort (status ASC, order_date DESC, order_id DESC) without a filesort
+        db.Index('ix_orders_status_date_id', status, order_date.desc(), order_id.desc()),
+        db.Index('ix_orders_user_date_id', 'user_id', 'order_date', 'order_id'),
+        db.Index('ix_orders_amount_id', 'total_amount', 'order_id'),
+    )
+
+@event.listens_for(Order, 'before_insert')
+@event.listens_for(Order, 'before_update')
+def set_order_buckets(mapper, connection, order):
+    """Derive the persisted date buckets from order_date on every ORM write"""
+    if order.order_date is not None:
+        order.order_day = order.order_date.date()
+        order.order_month = order.order_date.strftime('%Y-%m')
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
@@ -113,6 +189,28 @@ class OrderItem(db.Model):
     # Relationships
     book = db.relationship('Book', backref='order_items')
 
+# Sales rollups for the admin summary, maintained by analytics.py
+class OrderDailyRollup(db.Model):
+    __tablename__ = 'order_daily_rollups'
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    month = db.Column(db.String(7), nullable=False, index=True)  # YYYY-MM
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class BookSalesRollup(db.Model):
+    __tablename__ = 'book_sales_rollups'
+    book_id = db.Column(db.Integer, db.ForeignKey('books.book_id'), primary_key=True)
+    times_ordered = db.Column(db.Integer, nullable=False, default=0)
+    total_sold = db.Column(db.Integer, nullable=False, default=0, index=True)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class CustomerSpendRollup(db.Model):
+    __tablename__ = 'customer_spend_rollups'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), primary_key=True)
+    total_orders = db.Column(db.Integer, nullable=False, default=0)
+    total_spent = db.Column(db.Numeric(14, 2), nullable=False, default=0, index=True)
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
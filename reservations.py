@@ -0,0 +1,259 @@
+"""
+Time-limited stock holds for carts.
+
+Adding a book to a cart or opening checkout places a hold on those units
+for RESERVATION_HOLD_MINUTES. Available-to-sell is a book's stock minus the
+active holds of everyone else, so a hot book stops accepting new carts once
+its units are spoken for instead of failing late at checkout. Expired
+holds are ignored immediately and deleted by the sweeper.
+
+Run ``python reservations.py`` to sweep from a separate process, or call
+start_reservation_sweeper(app) to sweep from a background thread.
+"""
+
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from model import db, Book, StockReservation
+
+DEFAULT_HOLD_MINUTES = 15
+DEFAULT_SWEEP_INTERVAL_SECONDS = 60
+
+
+def user_holder(user_id):
+    return f'user:{user_id}'
+
+
+def session_holder(session_key):
+    return f'session:{session_key}'
+
+
+def hold_expiry(now):
+    minutes = current_app.config.get('RESERVATION_HOLD_MINUTES', DEFAULT_HOLD_MINUTES)
+    return now + timedelta(minutes=minutes)
+
+
+def held_by_others(book_id, holder, now):
+    """Scalar subquery: units of a book under active holds by other holders"""
+    return db.select(db.func.coalesce(db.func.sum(StockReservation.quantity), 0)).where(
+        StockReservation.book_id == book_id,
+        StockReservation.expires_at > now,
+        StockReservation.holder != holder
+    ).scalar_subquery()
+
+
+def available_stock_query(book_ids, holder, now):
+    """(book_id, stock, held_by_others) rows for the given books, in book_id order"""
+    hold_filter = [StockReservation.expires_at > now]
+    if holder:
+        hold_filter.append(StockReservation.holder != holder)
+    holds = db.session.query(
+        StockReservation.book_id,
+        db.func.sum(StockReservation.quantity).label('held')
+    ).filter(StockReservation.book_id.in_(book_ids), *hold_filter)\
+     .group_by(StockReservation.book_id).subquery()
+
+    return db.session.query(Book.book_id, Book.stock, db.func.coalesce(holds.c.held, 0))\
+        .outerjoin(holds, holds.c.book_id == Book.book_id)\
+        .filter(Book.book_id.in_(book_ids))\
+        .order_by(Book.book_id)
+
+
+def get_available_stock(book_ids, holder=None):
+    """Available-to-sell per book: stock minus other holders' active holds (one query)"""
+    book_ids = set(book_ids)
+    if not book_ids:
+        return {}
+
+    rows = available_stock_query(book_ids, holder, datetime.now()).all()
+    return {book_id: max((stock or 0) - int(held), 0) for book_id, stock, held in rows}
+
+
+def hold_quantities(holder, quantities, partial=False):
+    """Set the holder's holds to quantities ({book_id: quantity}) where stock allows.
+
+    The book rows are locked first, so concurrent holds on the same books
+    are serialized; the holds are then read with a locking read, which sees
+    holds committed by whoever held the book locks before us (a plain read
+    would see the transaction's REPEATABLE READ snapshot). Books whose
+    quantity cannot be held keep their current hold, or with partial=True
+    are held for as much as is available. Runs in the caller's transaction:
+    commit to keep the holds, or roll back to release the locks. Returns the
+    available quantity per requested book (0 for books that no longer exist).
+    """
+    if not quantities:
+        return {}
+
+    now = datetime.now()
+    stocks = db.session.query(Book.book_id, Book.stock)\
+        .filter(Book.book_id.in_(list(quantities)))\
+        .order_by(Book.book_id).with_for_update().all()
+    found = {book_id for book_id, _ in stocks}
+    if not found:
+        return dict.fromkeys(quantities, 0)
+
+    # Other holders' active holds plus any hold of our own, expired or not
+    holds = db.session.query(
+        StockReservation.reservation_id, StockReservation.holder, StockReservation.book_id,
+        StockReservation.quantity, StockReservation.expires_at
+    ).filter(
+        StockReservation.book_id.in_(list(found)),
+        (StockReservation.expires_at > now) | (StockReservation.holder == holder)
+    ).order_by(StockReservation.reservation_id).with_for_update().all()
+
+    held = {}
+    existing = {}
+    for reservation_id, hold_holder, book_id, quantity, _ in holds:
+        if hold_holder == holder:
+            existing[book_id] = reservation_id
+        else:
+            held[book_id] = held.get(book_id, 0) + quantity
+
+    available = dict.fromkeys(quantities, 0)
+    for book_id, stock in stocks:
+        available[book_id] = max((stock or 0) - held.get(book_id, 0), 0)
+
+    if partial:
+        granted = {book_id: min(quantity, available[book_id]) for book_id, quantity in quantities.items()
+                   if book_id in found and available[book_id] > 0}
+    else:
+        granted = {book_id: quantity for book_id, quantity in quantities.items()
+                   if book_id in found and quantity <= available[book_id]}
+    if granted:
+        expires_at = hold_expiry(now)
+        updates = [{'reservation_id': existing[book_id], 'quantity': quantity, 'expires_at': expires_at}
+                   for book_id, quantity in granted.items() if book_id in existing]
+        inserts = [{'holder': holder, 'book_id': book_id, 'quantity': quantity, 'expires_at': expires_at}
+                   for book_id, quantity in granted.items() if book_id not in existing]
+        if updates:
+            db.session.execute(db.update(StockReservation), updates)
+        if inserts:
+            db.session.execute(db.insert(StockReservation), inserts)
+    return available
+
+
+def reserve_stock(holder, book_id, quantity):
+    """Hold `quantity` units (the holder's new total, not an increment) of a book.
+
+    Returns (ok, available), where available is what the holder could hold
+    at most. See hold_quantities for locking and transaction behaviour.
+    """
+    available = hold_quantities(holder, {book_id: quantity})[book_id]
+    return quantity <= available, available
+
+
+def refresh_holds(holder, quantities):
+    """Re-hold every cart line, e.g. when entering checkout.
+
+    quantities maps book_id to the quantity in the cart. Returns a
+    shortfall entry for every line that could not be fully held. Runs in
+    the caller's transaction.
+    """
+    available = hold_quantities(holder, quantities)
+    return [
+        {'book_id': book_id, 'requested': quantity, 'available': available[book_id]}
+        for book_id, quantity in sorted(quantities.items())
+        if quantity > available[book_id]
+    ]
+
+
+def release_holds(holder, book_ids=None):
+    """Drop a holder's holds, optionally only for some books. Caller commits."""
+    query = StockReservation.query.filter(StockReservation.holder == holder)
+    if book_ids is not None:
+        query = query.filter(StockReservation.book_id.in_(list(book_ids)))
+    return query.delete(synchronize_session=False)
+
+
+def transfer_holds(from_holder, to_holder):
+    """Merge an anonymous session's active holds into the logged-in user's. Caller commits.
+
+    Each set of holds was placed with the other counted against it, so the
+    sums never exceed stock and can be merged without re-checking. Issues
+    the same handful of statements whatever the number of holds.
+    """
+    now = datetime.now()
+    # Expired holds on either side would only collide with the moved rows
+    StockReservation.query.filter(
+        StockReservation.holder.in_([from_holder, to_holder]),
+        StockReservation.expires_at <= now
+    ).delete(synchronize_session=False)
+
+    session_holds = StockReservation.query.filter(StockReservation.holder == from_holder).all()
+    if not session_holds:
+        return 0
+    book_ids = [hold.book_id for hold in session_holds]
+
+    user_holds = {hold.book_id: hold for hold in StockReservation.query.filter(
+        StockReservation.holder == to_holder,
+        StockReservation.book_id.in_(book_ids)
+    ).all()}
+    merged = [
+        {'reservation_id': user_holds[hold.book_id].reservation_id,
+         'quantity': user_holds[hold.book_id].quantity + hold.quantity,
+         'expires_at': max(user_holds[hold.book_id].expires_at, hold.expires_at)}
+        for hold in session_holds if hold.book_id in user_holds
+    ]
+    if merged:
+        db.session.execute(db.update(StockReservation), merged)
+        release_holds(from_holder, user_holds)
+
+    StockReservation.query.filter(StockReservation.holder == from_holder)\
+        .update({'holder': to_holder}, synchronize_session=False)
+    return len(session_holds)
+
+
+def release_expired_reservations():
+    """Delete expired holds (index range scan on expires_at) and commit"""
+    released = StockReservation.query.filter(StockReservation.expires_at <= datetime.now())\
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return released
+
+
+def start_reservation_sweeper(app, interval_seconds=None):
+    """Sweep expired holds from a daemon thread every interval_seconds"""
+    interval = interval_seconds or app.config.get('RESERVATION_SWEEP_INTERVAL_SECONDS',
+                                                  DEFAULT_SWEEP_INTERVAL_SECONDS)
+
+    def sweep_forever():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    release_expired_reservations()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error releasing expired reservations: {e}")
+
+    thread = threading.Thread(target=sweep_forever, name='reservation-sweeper', daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    """Run the sweeper in the foreground as its own process"""
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from app import app
+
+    interval = app.config.get('RESERVATION_SWEEP_INTERVAL_SECONDS', DEFAULT_SWEEP_INTERVAL_SECONDS)
+    print(f"🧹 Releasing expired stock reservations every {interval}s (Ctrl+C to stop)")
+    while True:
+        with app.app_context():
+            try:
+                released = release_expired_reservations()
+                if released:
+                    print(f"✅ Released {released} expired reservations")
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Error releasing expired reservations: {e}")
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Full and incremental CSV exports against a throwaway SQLite database.
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import csv
+import sys
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+TEST_DIR = tempfile.mkdtemp()
+# Always a scratch database: never export from (or write to) a configured one
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(TEST_DIR, 'test.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from model import db, User, Book, Order, OrderItem
+from export_database_to_csv import (export_tables_full, export_tables_incremental, create_summary_csv,
+                                    read_export_summary)
+
+
+def read_keys(filename):
+    """Primary keys (first column) of every data row in an export file"""
+    with open(filename, newline='', encoding='utf-8') as csvfile:
+        return [row[0] for row in list(csv.reader(csvfile))[1:]]
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.export_dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        user = User(username='reader', email='reader@example.com')
+        user.set_password('secret')
+        book = Book(title='Settled', author='Author', isbn='isbn-1', price=Decimal('9.99'), stock=5)
+        db.session.add_all([user, book])
+        db.session.flush()
+        self.old_order_id = self.add_order(user, book, datetime.now() - timedelta(days=1))
+        # Stamped just now: its transaction could still be open elsewhere
+        self.new_order_id = self.add_order(user, book, datetime.now())
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        shutil.rmtree(self.export_dir)
+
+    def add_order(self, user, book, order_date):
+        order = Order(user_id=user.user_id, order_date=order_date, status='pending',
+                      total_amount=Decimal('9.99'), payment_method='paypal')
+        db.session.add(order)
+        db.session.flush()
+        db.session.add(OrderItem(order_id=order.order_id, book_id=book.book_id, quantity=1,
+                                 price_at_time=Decimal('9.99')))
+        return order.order_id
+
+    def test_full_export_includes_just_created_order(self):
+        stats, marks = export_tables_full(self.export_dir)
+        create_summary_csv(self.export_dir, stats, marks)
+
+        order_ids = read_keys(os.path.join(self.export_dir, 'orders.csv'))
+        self.assertEqual(order_ids, [str(self.old_order_id), str(self.new_order_id)])
+        self.assertEqual(len(read_keys(os.path.join(self.export_dir, 'order_items.csv'))), 2)
+
+        summary = read_export_summary(self.export_dir)
+        self.assertEqual(summary['orders']['record_count'], '2')
+        # The mark stays below the unsettled order
+        self.assertEqual(summary['orders']['high_water_mark'], str(self.old_order_id))
+        self.assertEqual(summary['orders']['rows_past_mark'], '1')
+
+    def test_incremental_counts_rows_past_mark_once(self):
+        stats, marks = export_tables_full(self.export_dir)
+        create_summary_csv(self.export_dir, stats, marks)
+
+        # Still settling: nothing is appended
+        stats, marks = export_tables_incremental(self.export_dir, read_export_summary(self.export_dir))
+        create_summary_csv(self.export_dir, stats, marks, 'incremental')
+        self.assertEqual(len(read_keys(os.path.join(self.export_dir, 'orders.csv'))), 2)
+
+        # Settled: the order is appended again but counted once
+        settled_before = datetime.now() + timedelta(seconds=1)
+        stats, marks = export_tables_incremental(self.export_dir, read_export_summary(self.export_dir),
+                                                 settled_before=settled_before)
+        create_summary_csv(self.export_dir, stats, marks, 'incremental')
+        order_ids = read_keys(os.path.join(self.export_dir, 'orders.csv'))
+        summary = read_export_summary(self.export_dir)
+        self.assertEqual(order_ids.count(str(self.new_order_id)), 2)
+        self.assertEqual(int(summary['orders']['record_count']), len(set(order_ids)))
+        self.assertEqual(summary['orders']['high_water_mark'], str(self.new_order_id))
+        self.assertEqual(summary['orders']['rows_past_mark'], '')
+
+
+if __name__ == '__main__':
+    unittest.main()